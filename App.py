@@ -1,29 +1,171 @@
 # app.py
 import re
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Request, render_template, request, jsonify, send_file, g, make_response
+import io
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.utils import secure_filename
 from atp_photo_insert import ATPPhotoInserter
-from atp_text_insert import ATPTextReplacer
 import tempfile
+import zipfile
 from atp_docx_insert import ATPDocxInserter
+from atp_placeholders import get_registry
+from atp_report_archive import ReportArchive
+from atp_report_patch import ReportPatcher, build_manifest
+from atp_report_preview import build_preview
+from atp_sheet_parallel import fill_workbook, scan_workbook
+from atp_template_store import TemplateStore, hash_bytes
+from atp_template_pool import TemplatePool
+from atp_image_intake import ImageRejected, prepare_image, probe_image
+import shutil
+import functools
+import hmac
+import uuid
+import openpyxl
+from docx import Document
+from atp_profiling import RequestProfiler
+
+
+
+class InMemoryRequest(Request):
+    """Keep uploaded files in memory instead of spooling them to temp files."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
 
 app = Flask(__name__)
 app.config["UPLOAD_FOLDER"] = "uploads"
 app.config["MAX_CONTENT_LENGTH"] = 50 * 1024 * 1024
 IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
 TEMPLATE_EXTENSIONS = {"xlsx", "xls", "docx"}
+# Display size of an inserted photo: pixels in Excel, inches in DOCX
+EXCEL_PHOTO_SIZE = (300, 200)
+DOCX_PHOTO_INCHES = (3.0, 2.0)
+# Output packing: deflate level for XML parts and threads for large parts
+app.config["ZIP_COMPRESS_LEVEL"] = 6
+app.config["ZIP_WORKERS"] = min(4, os.cpu_count() or 1)
+# Photos are embedded at up to this multiple of their display size (DOCX
+# inches at 96 dpi) and decoded scaled down; 0 embeds the original files
+app.config["PHOTO_EMBED_SCALE"] = 2
+# Thumbnail box of the per-slot preview returned with each report
+app.config["PREVIEW_THUMB_SIZE"] = (160, 120)
+# Generated reports are kept here (files + SQLite index) for re-download
+app.config["REPORT_ARCHIVE_DIR"] = os.environ.get("ATP_REPORT_ARCHIVE_DIR", "reports")
+
+# Opt-in request profiling: send X-ATP-Profile: <token> (or ?profile=<token>).
+# Disabled entirely when no token is configured.
+app.config["PROFILE_TOKEN"] = os.environ.get("ATP_PROFILE_TOKEN", "")
+app.config["PROFILE_DIR"] = os.environ.get("ATP_PROFILE_DIR", "profiles")
+
+# In-memory pipeline: uploads, photos and the generated report stay in
+# memory buffers (bounded by MAX_CONTENT_LENGTH); set False to use temp dirs
+app.config["IN_MEMORY_PIPELINE"] = os.environ.get("ATP_IN_MEMORY_PIPELINE", "1") != "0"
+if app.config["IN_MEMORY_PIPELINE"]:
+    app.request_class = InMemoryRequest
+# Templates + placeholder plans shared by all workers, addressed by SHA-256
+app.config["TEMPLATE_STORE_DIR"] = os.environ.get("ATP_TEMPLATE_STORE_DIR", "template_store")
+app.config["TEMPLATE_STORE_MAX_BYTES"] = 2 * 1024 * 1024 * 1024
+# Parsed templates kept warm per worker process, by estimated memory use
+app.config["TEMPLATE_POOL_MAX_BYTES"] = int(
+    os.environ.get("ATP_TEMPLATE_POOL_MAX_BYTES", 256 * 1024 * 1024)
+)
+# ASGI mode (atp_asgi.py): handler threads for CPU work once a body has
+# arrived, I/O threads and chunk size for streaming responses back
+app.config["ASGI_WORKERS"] = int(os.environ.get("ATP_ASGI_WORKERS", 2 * (os.cpu_count() or 1)))
+app.config["ASGI_IO_WORKERS"] = 4
+app.config["ASGI_STREAM_CHUNK"] = 256 * 1024
+# Processes used to scan / fill worksheets of large workbooks in parallel
+app.config["SHEET_WORKERS"] = int(os.environ.get("ATP_SHEET_WORKERS", os.cpu_count() or 1))
+# Multi-template jobs (/generate_reports): templates per job, outputs built at once
+app.config["JOB_MAX_TEMPLATES"] = 8
+app.config["JOB_WORKERS"] = int(os.environ.get("ATP_JOB_WORKERS", 4))
+
+report_archive = ReportArchive(app.config["REPORT_ARCHIVE_DIR"])
+template_store = TemplateStore(
+    app.config["TEMPLATE_STORE_DIR"], app.config["TEMPLATE_STORE_MAX_BYTES"]
+)
+template_pool = TemplatePool(app.config["TEMPLATE_POOL_MAX_BYTES"])
+
+
+def checkout_template(template_hash, file_type):
+    """
+    Parsed, request-owned copy of a stored template (Workbook or Document)
+    from the per-worker pool; parsed from the template store on a miss.
+    """
+
+    def parse():
+        with template_store.open(template_hash) as source:
+            if file_type == "excel":
+                return openpyxl.load_workbook(source)
+            return Document(source)
+
+    return template_pool.checkout(template_hash, parse)
 
 
 def allowed_template(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in TEMPLATE_EXTENSIONS
 
 
+def valid_template_bytes(data):
+    """Templates are OOXML packages; empty or non-ZIP bytes are never stored."""
+    return bool(data) and zipfile.is_zipfile(io.BytesIO(data))
+
+
 def allowed_image(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in IMAGE_EXTENSIONS
 
 
+def is_profile_admin():
+    token = app.config["PROFILE_TOKEN"]
+    if not token:
+        return False
+    supplied = request.headers.get("X-ATP-Profile") or request.args.get("profile", "")
+    return hmac.compare_digest(supplied.encode(), token.encode())
+
+
+def profiled(view):
+    """
+    Profile the view when an admin asks for it. Artifacts go to
+    PROFILE_DIR/<job id> (the report id when the view produced one) and the
+    listing URL is returned in the X-ATP-Profile-Url header.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_profile_admin():
+            return view(*args, **kwargs)
+
+        with RequestProfiler() as profiler:
+            g.profiler = profiler
+            response = make_response(view(*args, **kwargs))
+
+        job_id = g.get("job_id") or uuid.uuid4().hex
+        profiler.write(os.path.join(app.config["PROFILE_DIR"], job_id), view.__name__)
+        response.headers["X-ATP-Profile-Url"] = f"/profiles/{job_id}"
+        return response
+
+    return wrapper
+
+
+def profiled_task(func):
+    """
+    Wrap a task for a worker pool so that, in a profiled request, the work
+    done on the pool's threads shows up in the request's profile.
+    Call while handling the request; a no-op when profiling is off.
+    """
+    profiler = g.get("profiler")
+    if profiler is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profiler.thread():
+            return func(*args, **kwargs)
+
+    return wrapper
+
 
 @app.route("/")
 def index():
@@ -32,6 +174,7 @@ def index():
 
 # app.py (updated analyze_template endpoint)
 @app.route("/analyze_template", methods=["POST"])
+@profiled
 def analyze_template():
     """
     API endpoint to analyze uploaded template (Excel or DOCX).
@@ -51,60 +194,79 @@ def analyze_template():
             400,
         )
 
-    temp_dir = tempfile.mkdtemp()
-    template_path = os.path.join(temp_dir, secure_filename(template_file.filename))
-    template_file.save(template_path)
+    template_bytes = template_file.read()
+    if not valid_template_bytes(template_bytes):
+        return jsonify({"error": "Invalid template file: empty or not an Excel / Word document"}), 400
+    template_hash = hash_bytes(template_bytes)
+    registry = get_registry()
+
+    # Another worker (or a previous run) may already have analyzed these bytes
+    stored = template_store.get(template_hash, registry.fingerprint)
+    if stored and stored["analysis"]:
+        return jsonify({**stored["analysis"], "template_name": template_file.filename})
 
     try:
-        # Determine file type and use appropriate processor
-        if filename.endswith((".xlsx", ".xls")):
-            # Excel template
-            inserter = ATPPhotoInserter(template_path)
-            photo_slots = inserter.get_available_photo_slots()
-            # Get text fields if available
-            if hasattr(inserter, "get_available_text_fields"):
+        template_store.put(template_bytes, template_file.filename, template_hash)
+
+        with template_store.open(template_hash) as source:
+            # Determine file type and use appropriate processor
+            if filename.endswith((".xlsx", ".xls")):
+                # Excel template - scanned from the sheet XML, one sheet per process
+                photo_mappings, text_mappings = scan_workbook(
+                    source, registry, workers=app.config["SHEET_WORKERS"]
+                )
+                inserter = ATPPhotoInserter.from_plan(
+                    {"photo_mappings": photo_mappings, "text_mappings": text_mappings}, registry
+                )
+                photo_slots = inserter.get_available_photo_slots()
+                # Get text fields if available
+                if hasattr(inserter, "get_available_text_fields"):
+                    text_fields = inserter.get_available_text_fields()
+                else:
+                    text_fields = []
+
+            elif filename.endswith(".docx"):
+                # Word template - parsed through the pool so the upload that follows is warm
+                inserter = ATPDocxInserter(checkout_template(template_hash, "docx"))
+                photo_slots = inserter.get_available_photo_slots()
                 text_fields = inserter.get_available_text_fields()
-            else:
-                text_fields = []
-
-        elif filename.endswith(".docx"):
-            # Word template
-            inserter = ATPDocxInserter(template_path)
-            photo_slots = inserter.get_available_photo_slots()
-            text_fields = inserter.get_available_text_fields()
 
-        else:
-            return jsonify({"error": "Unsupported file type"}), 400
+            else:
+                return jsonify({"error": "Unsupported file type"}), 400
 
         # Store processor type for later use
         file_type = "excel" if filename.endswith((".xlsx", ".xls")) else "docx"
 
-        # Clean up
-        os.remove(template_path)
-        os.rmdir(temp_dir)
+        analysis = {
+            "success": True,
+            "template_name": template_file.filename,
+            "template_hash": template_hash,
+            "file_type": file_type,
+            "photo_slots": photo_slots,
+            "text_fields": text_fields,
+            "slots_count": len(photo_slots),
+            "text_fields_count": len(text_fields),
+        }
+        template_store.set_analysis(template_hash, analysis, inserter.get_plan(), registry.fingerprint)
 
-        return jsonify(
-            {
-                "success": True,
-                "template_name": template_file.filename,
-                "file_type": file_type,
-                "photo_slots": photo_slots,
-                "text_fields": text_fields,
-                "slots_count": len(photo_slots),
-                "text_fields_count": len(text_fields),
-            }
-        )
+        return jsonify(analysis)
 
     except Exception as e:
-        # Clean up on error
-        if "template_path" in locals() and os.path.exists(template_path):
-            os.remove(template_path)
-        if "temp_dir" in locals() and os.path.exists(temp_dir):
-            os.rmdir(temp_dir)
-
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/templates/<template_hash>")
+def template_status(template_hash):
+    """
+    Hash-first negotiation: return the cached analysis for a template the
+    server already has, so the client can skip uploading it.
+    """
+    stored = template_store.get(template_hash.lower(), get_registry().fingerprint)
+    if not stored or not stored["analysis"]:
+        return jsonify({"known": False}), 404
+    return jsonify({**stored["analysis"], "known": True})
+
+
 # app.py (updated upload_photos endpoint)
 # app.py - Fix the standardize_key function
 
@@ -113,89 +275,189 @@ def analyze_template():
 def standardize_key(key):
     """
     Standardize placeholder keys to a consistent format.
+    Variations (siteid, text_SITE_ID, tgl, ...) are defined in placeholders.json.
     """
-    # Convert to lowercase first
-    key = key.lower()
-    key = key.replace('text_', '')  # Remove 'text_' prefix if present
-
-    # Handle common variations
-    variations = {
-        "siteid": "site_id",
-        "sitename": "site_name",
-        "scopeofwork": "scope_of_work",
-        "devicetype": "device_type",
-        "projectcode": "project_code",
-        "sk1": "sk_1",
-        "siteid1": "site_id1",
-        "sitename1": "site_name1",
-        # Add date variations
-        "tanggal": "date",
-        "tgl": "date",
+    return get_registry().canonical_key(key)
+
+
+# Form fields that are never placeholder values
+RESERVED_FORM_KEYS = {"photo_mappings", "template_hash", "template_hashes", "template_name", "deliver"}
+# File fields carrying templates rather than photos
+TEMPLATE_FILE_KEYS = {"excel_file", "template_files"}
+
+
+def embed_size(display_size, dpi=1):
+    """Pixel box photos shown at display_size are scaled into, None to keep originals."""
+    scale = app.config["PHOTO_EMBED_SCALE"]
+    if not scale:
+        return None
+    return (round(display_size[0] * dpi * scale), round(display_size[1] * dpi * scale))
+
+
+def check_photos(files):
+    """Header-only validation of every uploaded photo, before any template work."""
+    for key, photo_file in files.items():
+        if key in TEMPLATE_FILE_KEYS or photo_file.filename == "":
+            continue
+        try:
+            probe_image(photo_file.stream)
+        except ImageRejected as e:
+            raise ImageRejected(f"{photo_file.filename}: {e}") from e
+
+
+def open_photo(photo_file, temp_dir, max_size=None):
+    """
+    Photo source for the processors, scaled into max_size if larger (see
+    atp_image_intake.prepare_image): a buffer in the in-memory pipeline
+    (temp_dir is None), otherwise a file saved in temp_dir.
+    """
+    photo = prepare_image(photo_file.stream, max_size)
+    if temp_dir is None:
+        return photo
+
+    photo_path = os.path.join(temp_dir, f"{uuid.uuid4().hex[:8]}_{secure_filename(photo_file.filename)}")
+    with open(photo_path, "wb") as f:
+        shutil.copyfileobj(photo, f)
+    return photo_path
+
+
+def collect_text_values(form):
+    """
+    Text values from the form - any field may feed a placeholder, since
+    templates can contain tokens discovered generically by the registry.
+    """
+    text_values = {}
+    for key in form:
+        if key in RESERVED_FORM_KEYS:
+            continue
+        form_value = form.get(key)
+        if form_value:
+            text_values[standardize_key(key)] = form_value
+    return text_values
+
+
+def output_template_name(template_name, stored):
+    """File type follows the stored bytes, the client-side name only names the output."""
+    if not allowed_template(template_name) or (
+        os.path.splitext(template_name)[1].lower() != os.path.splitext(stored["template_file"])[1]
+    ):
+        return stored["filename"]
+    return template_name
+
+
+def sanitize_project_code(raw_project_code):
+    project_code = re.sub(r'[<>:"/\\|?*]', "", raw_project_code.strip())
+    return project_code or "ATP_Project"
+
+
+def report_filename(project_code, template_name, extension):
+    template_basename = os.path.splitext(secure_filename(template_name))[0]
+    return f"{project_code}_ATP_Photos_{template_basename}.{extension}"
+
+
+def save_report(inserter, file_type, text_values, output, registry):
+    """Pack a filled report; Excel text is filled per sheet while packing."""
+    pack_options = {
+        "compresslevel": app.config["ZIP_COMPRESS_LEVEL"],
+        "workers": app.config["ZIP_WORKERS"],
     }
+    if file_type == "excel":
+        fill_workbook(
+            inserter.wb,
+            inserter.text_mappings,
+            text_values,
+            output,
+            registry,
+            sheet_workers=app.config["SHEET_WORKERS"],
+            **pack_options,
+        )
+    else:
+        inserter.save(output, **pack_options)
 
-    return variations.get(key, key)
+
+def archive_report(output, output_filename, inserter, file_type, text_values, project_code, template_name, template_hash, registry):
+    """
+    Archive a saved report (buffer or file path, the file is moved) with its
+    job manifest and preview.
+
+    Returns:
+        tuple: (archive record, preview)
+    """
+    archive_meta = {
+        "project_code": project_code,
+        "site_id": text_values.get("site_id"),
+        "template_name": template_name,
+        "template_hash": template_hash,
+    }
+    if isinstance(output, io.BytesIO):
+        record = report_archive.add_bytes(output.getbuffer(), output_filename, **archive_meta)
+    else:
+        record = report_archive.add(output, **archive_meta)
+
+    # Placeholder locations and media parts, so corrections can patch this report
+    manifest = build_manifest(inserter, file_type, text_values)
+    report_archive.save_manifest(record["report_id"], manifest)
+
+    # Thumbnails of what landed in each slot, so the crew can check without downloading
+    preview = build_preview(
+        output if isinstance(output, io.BytesIO) else record["path"],
+        manifest,
+        registry,
+        app.config["PREVIEW_THUMB_SIZE"],
+    )
+    report_archive.save_preview(record["report_id"], preview)
+    return record, preview
 
 
 @app.route("/upload_photos", methods=["POST"])
+@profiled
 def upload_photos():
     """
     Main processing endpoint for both Excel and DOCX templates.
     """
     try:
-        template_file = request.files["excel_file"]  # Now can be Excel or DOCX
-        filename = template_file.filename.lower()
-        raw_project_code = request.form.get("project_code", "UNKNOWN").strip()
-
-        # Sanitize project code
-        project_code = re.sub(r'[<>:"/\\|?*]', "", raw_project_code)
-        if not project_code:
-            project_code = "ATP_Project"
-
-        temp_dir = tempfile.mkdtemp()
-        template_path = os.path.join(temp_dir, secure_filename(template_file.filename))
-        template_file.save(template_path)
-
-        # Collect text values
-        text_values = {}
-        possible_text_keys = [
-            "site_id",
-            "siteid",
-            "site_name",
-            "sitename",
-            "hostname",
-            "scope_of_work",
-            "scopeofwork",
-            "device_type",
-            "devicetype",
-            "project_code",
-            "projectcode",
-            "siteid1",
-            "site_id1",
-            "sk1",
-            "sk_1",
-            "date",  # ADD THIS
-            "engineer",  # ADD THIS
-            "location",  # ADD THIS
-            "address",  # ADD THIS
-        ]
+        # Corrupt or disguised photos are rejected before the template is touched
+        check_photos(request.files)
+
+        # Template comes either as a file or as the hash of a cached one
+        template_file = request.files.get("excel_file")  # Now can be Excel or DOCX
+        template_hash = request.form.get("template_hash", "").strip().lower()
+        registry = get_registry()
+        if template_file and template_file.filename:
+            template_name = template_file.filename
+            if not allowed_template(template_name):
+                return jsonify({"error": "Invalid template file. Use .xlsx, .xls, or .docx"}), 400
+            template_bytes = template_file.read()
+            if not valid_template_bytes(template_bytes):
+                return jsonify({"error": "Invalid template file: empty or not an Excel / Word document"}), 400
+            template_hash = template_store.put(template_bytes, template_name)
+            stored = template_store.get(template_hash, registry.fingerprint)
+        elif template_hash:
+            stored = template_store.get(template_hash, registry.fingerprint)
+            if not stored:
+                return (
+                    jsonify({"error": "Template not cached, please upload it", "template_missing": True}),
+                    409,
+                )
+            template_name = request.form.get("template_name") or stored["filename"]
+        else:
+            return jsonify({"error": "No file uploaded"}), 400
 
-        for key in possible_text_keys:
-            form_value = request.form.get(key)
-            if form_value:
-                standardized_key = standardize_key(key)
-                text_values[standardized_key] = form_value
+        template_name = output_template_name(template_name, stored)
+        filename = template_name.lower()
+        # Placeholder plan from the analysis step, if any worker recorded one
+        plan = stored["plan"]
+        project_code = sanitize_project_code(request.form.get("project_code", "UNKNOWN"))
 
-        # Also collect any text_ prefixed fields
-        for key in request.form:
-            if key.startswith("text_"):
-                text_key = key.replace("text_", "")
-                standardized_key = standardize_key(text_key)
-                text_values[standardized_key] = request.form.get(key)
+        in_memory = app.config["IN_MEMORY_PIPELINE"]
+        temp_dir = None if in_memory else tempfile.mkdtemp()
+
+        text_values = collect_text_values(request.form)
 
         # Determine file type and use appropriate processor
         if filename.endswith((".xlsx", ".xls")):
             # Process Excel template
-            inserter = ATPPhotoInserter(template_path)
+            inserter = ATPPhotoInserter(checkout_template(template_hash, "excel"), plan=plan)
 
             # Get photo mappings
             photo_mappings = json.loads(request.form.get("photo_mappings", "[]"))
@@ -212,43 +474,35 @@ def upload_photos():
                 if photo_file.filename == "" or not allowed_image(photo_file.filename):
                     continue
 
-                photo_path = os.path.join(
-                    temp_dir, secure_filename(photo_file.filename)
-                )
-                photo_file.save(photo_path)
+                photo_source = open_photo(photo_file, temp_dir, embed_size(EXCEL_PHOTO_SIZE))
 
                 # Use appropriate insertion method
                 if "slot_index" in mapping:
                     # Old method by placeholder
                     inserter.insert_photo_by_placeholder(
                         mapping["photo_type"],
-                        photo_path,
-                        resize_width=300,
-                        resize_height=200,
+                        photo_source,
+                        resize_width=EXCEL_PHOTO_SIZE[0],
+                        resize_height=EXCEL_PHOTO_SIZE[1],
                     )
                 elif "target_cell" in mapping:
                     # New method by cell reference
                     inserter.insert_photo_by_cell(
                         mapping["sheet"],
                         mapping["target_cell"],
-                        photo_path,
-                        resize_width=300,
-                        resize_height=200,
+                        photo_source,
+                        resize_width=EXCEL_PHOTO_SIZE[0],
+                        resize_height=EXCEL_PHOTO_SIZE[1],
                     )
 
-            # Replace text
-            text_replacer = ATPTextReplacer(inserter.wb)
-            text_replacer.replace(text_values)
+            # Text is filled per sheet while saving, see fill_workbook below
 
-            # Generate output filename
-            template_basename = os.path.splitext(
-                secure_filename(template_file.filename)
-            )[0]
-            output_filename = f"{project_code}_ATP_Photos_{template_basename}.xlsx"
+            file_type = "excel"
+            output_filename = report_filename(project_code, template_name, "xlsx")
 
         elif filename.endswith(".docx"):
             # Process DOCX template
-            inserter = ATPDocxInserter(template_path)
+            inserter = ATPDocxInserter(checkout_template(template_hash, "docx"), plan=plan)
 
             # Get photo mappings
             photo_mappings = json.loads(request.form.get("photo_mappings", "[]"))
@@ -265,40 +519,62 @@ def upload_photos():
                 if photo_file.filename == "" or not allowed_image(photo_file.filename):
                     continue
 
-                photo_path = os.path.join(
-                    temp_dir, secure_filename(photo_file.filename)
-                )
-                photo_file.save(photo_path)
+                photo_source = open_photo(photo_file, temp_dir, embed_size(DOCX_PHOTO_INCHES, dpi=96))
 
                 # Insert photo by mapping index
                 if "slot_index" in mapping:
-                    inserter.insert_photo(mapping["slot_index"], photo_path)
+                    inserter.insert_photo(
+                        mapping["slot_index"],
+                        photo_source,
+                        width_inches=DOCX_PHOTO_INCHES[0],
+                        height_inches=DOCX_PHOTO_INCHES[1],
+                    )
 
             # Replace text
             inserter.replace_all_text(text_values)
 
-            # Generate output filename
-            template_basename = os.path.splitext(
-                secure_filename(template_file.filename)
-            )[0]
-            output_filename = f"{project_code}_ATP_Photos_{template_basename}.docx"
+            file_type = "docx"
+            output_filename = report_filename(project_code, template_name, "docx")
 
         else:
             return jsonify({"error": "Unsupported file type"}), 400
 
-        # Save the modified document
-        output_path = os.path.join(temp_dir, output_filename)
-        inserter.save(output_path)
+        # Save the modified document - into a buffer in the in-memory pipeline
+        output = io.BytesIO() if in_memory else os.path.join(temp_dir, output_filename)
+        save_report(inserter, file_type, text_values, output, registry)
+
+        # deliver=file streams the report back directly instead of archiving it
+        if request.form.get("deliver") == "file":
+            if in_memory:
+                output.seek(0)
+                return send_file(output, as_attachment=True, download_name=output_filename)
+            response = send_file(output, as_attachment=True, download_name=output_filename)
+            response.call_on_close(lambda: shutil.rmtree(temp_dir, ignore_errors=True))
+            return response
+
+        # Archive the report so it can be re-downloaded by site / project later
+        record, preview = archive_report(
+            output, output_filename, inserter, file_type, text_values,
+            project_code, template_name, template_hash, registry,
+        )
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        g.job_id = record["report_id"]
 
         return jsonify(
             {
                 "success": True,
                 "message": f"Successfully processed template with {len(photo_mappings)} photos and replaced {len(text_values)} text fields",
-                "download_url": f"/download/{os.path.basename(temp_dir)}/{output_filename}",
-                "temp_dir": temp_dir,
+                "download_url": report_download_url(record),
+                "report_id": record["report_id"],
+                "preview_url": report_preview_url(record),
+                "preview": preview,
             }
         )
 
+    except ImageRejected as e:
+        return jsonify({"error": f"Invalid photo {e}"}), 400
+
     except Exception as e:
         import traceback
 
@@ -307,14 +583,436 @@ def upload_photos():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/download/<temp_dir>/<filename>")
-def download_file(temp_dir, filename):
-    file_path = (
-        os.path.join("/tmp", temp_dir, filename)
-        if "tmp" in temp_dir
-        else os.path.join(temp_dir, filename)
+def template_file_type(stored):
+    return "docx" if stored["template_file"].endswith(".docx") else "excel"
+
+
+def job_photos(photo_mappings, files, embed_box, temp_dir):
+    """
+    Process a job's photos once for all of its outputs.
+
+    Returns:
+        list: (photo_type, bytes in the in-memory pipeline or a file path in
+        temp_dir), in upload order
+    """
+    photos = []
+    for mapping in photo_mappings:
+        photo_file = files.get(mapping.get("field_name") or "")
+        if not photo_file or photo_file.filename == "" or not allowed_image(photo_file.filename):
+            continue
+        if not mapping.get("photo_type"):
+            continue
+
+        photo = open_photo(photo_file, temp_dir, embed_box)
+        if temp_dir is None:
+            photo.seek(0)
+            photo = photo.read()
+            photo_file.stream.seek(0)
+        photos.append((mapping["photo_type"], photo))
+    return photos
+
+
+def assign_photos(photo_mappings, photos):
+    """
+    Pair photos with a template's slots by photo type, each photo going to
+    the first slot of its type not already taken.
+
+    Returns:
+        tuple: (list of (slot_index, photo), photo types with no free slot)
+    """
+    taken = set()
+    assigned = []
+    unmatched = []
+    for photo_type, photo in photos:
+        for slot_index, slot in enumerate(photo_mappings):
+            if slot_index not in taken and slot["photo_type"].casefold() == photo_type.casefold():
+                taken.add(slot_index)
+                assigned.append((slot_index, photo))
+                break
+        else:
+            unmatched.append(photo_type)
+    return assigned, unmatched
+
+
+def build_job_report(template, photos, text_values, project_code, temp_dir, registry):
+    """
+    Generate and archive one output of a multi-template job. Runs on a job
+    worker thread, so it takes everything it needs as arguments.
+
+    Returns:
+        dict: Report entry for the job response
+    """
+    file_type = template["file_type"]
+    try:
+        if file_type == "excel":
+            inserter = ATPPhotoInserter(
+                checkout_template(template["template_hash"], "excel"), registry=registry, plan=template["plan"]
+            )
+        else:
+            inserter = ATPDocxInserter(
+                checkout_template(template["template_hash"], "docx"), registry=registry, plan=template["plan"]
+            )
+
+        assigned, unmatched = assign_photos(inserter.photo_mappings, photos)
+        for slot_index, photo in assigned:
+            # Every output reads its own buffer over the shared photo bytes
+            photo_source = io.BytesIO(photo) if isinstance(photo, bytes) else photo
+            if file_type == "excel":
+                slot = inserter.photo_mappings[slot_index]
+                inserter.insert_photo_by_cell(
+                    slot["sheet"],
+                    slot["photo_cell"],
+                    photo_source,
+                    resize_width=EXCEL_PHOTO_SIZE[0],
+                    resize_height=EXCEL_PHOTO_SIZE[1],
+                )
+            else:
+                inserter.insert_photo(
+                    slot_index,
+                    photo_source,
+                    width_inches=DOCX_PHOTO_INCHES[0],
+                    height_inches=DOCX_PHOTO_INCHES[1],
+                )
+
+        if file_type == "docx":
+            inserter.replace_all_text(text_values)
+
+        output_filename = report_filename(
+            project_code, template["template_name"], "xlsx" if file_type == "excel" else "docx"
+        )
+        if temp_dir is None:
+            output = io.BytesIO()
+        else:
+            # Outputs share the job's temp dir; the hash prefix keeps same-named templates apart
+            output = os.path.join(temp_dir, f"{template['template_hash'][:8]}_{output_filename}")
+        save_report(inserter, file_type, text_values, output, registry)
+
+        record, preview = archive_report(
+            output, output_filename, inserter, file_type, text_values,
+            project_code, template["template_name"], template["template_hash"], registry,
+        )
+    except Exception as e:
+        import traceback
+
+        print(f"Error in generate_reports ({template['template_name']}): {str(e)}")
+        print(traceback.format_exc())
+        return {
+            "success": False,
+            "template_name": template["template_name"],
+            "file_type": file_type,
+            "error": str(e),
+        }
+
+    return {
+        "success": True,
+        "template_name": template["template_name"],
+        "template_hash": template["template_hash"],
+        "file_type": file_type,
+        "report_id": record["report_id"],
+        "download_url": report_download_url(record),
+        "preview_url": report_preview_url(record),
+        "preview": preview,
+        "photos_inserted": len(assigned),
+        "unmatched_photos": unmatched,
+    }
+
+
+@app.route("/generate_reports", methods=["POST"])
+@profiled
+def generate_reports():
+    """
+    Generate several reports (e.g. the Excel ATP and its Word variants)
+    from one job: one set of photos and text values, filled into every
+    template concurrently.
+
+    Form: template_files (one or more uploads) and/or template_hashes (JSON
+    list of cached template hashes); photo_mappings as a JSON list of
+    {field_name, photo_type} - each photo goes to the matching slot of every
+    template; text values as in /upload_photos.
+    """
+    try:
+        check_photos(request.files)
+        registry = get_registry()
+
+        templates = []
+        for template_file in request.files.getlist("template_files"):
+            if not template_file.filename:
+                continue
+            if not allowed_template(template_file.filename):
+                return jsonify({"error": f"Invalid template file {template_file.filename}. Use .xlsx, .xls, or .docx"}), 400
+            template_bytes = template_file.read()
+            if not valid_template_bytes(template_bytes):
+                return jsonify({"error": f"Invalid template file {template_file.filename}: empty or not an Excel / Word document"}), 400
+            template_hash = template_store.put(template_bytes, template_file.filename)
+            templates.append((template_hash, template_file.filename))
+
+        for template_hash in json.loads(request.form.get("template_hashes", "[]")):
+            templates.append((str(template_hash).strip().lower(), None))
+
+        if not templates:
+            return jsonify({"error": "No templates uploaded"}), 400
+        if len(templates) > app.config["JOB_MAX_TEMPLATES"]:
+            return jsonify({"error": f"At most {app.config['JOB_MAX_TEMPLATES']} templates per job"}), 400
+
+        resolved = {}
+        for template_hash, template_name in templates:
+            if template_hash in resolved:
+                continue  # same template twice would only produce the same report
+            stored = template_store.get(template_hash, registry.fingerprint)
+            if not stored:
+                return (
+                    jsonify(
+                        {
+                            "error": "Template not cached, please upload it",
+                            "template_missing": True,
+                            "template_hash": template_hash,
+                        }
+                    ),
+                    409,
+                )
+            resolved[template_hash] = {
+                "template_hash": template_hash,
+                "template_name": output_template_name(template_name or stored["filename"], stored),
+                "file_type": template_file_type(stored),
+                "plan": stored["plan"],
+            }
+        templates = list(resolved.values())
+
+        project_code = sanitize_project_code(request.form.get("project_code", "UNKNOWN"))
+        text_values = collect_text_values(request.form)
+
+        in_memory = app.config["IN_MEMORY_PIPELINE"]
+        temp_dir = None if in_memory else tempfile.mkdtemp()
+
+        # Photos are scaled once, into a box large enough for every output format
+        boxes = [
+            embed_size(EXCEL_PHOTO_SIZE) if t["file_type"] == "excel" else embed_size(DOCX_PHOTO_INCHES, dpi=96)
+            for t in templates
+        ]
+        embed_box = None if None in boxes else (max(b[0] for b in boxes), max(b[1] for b in boxes))
+        photo_mappings = json.loads(request.form.get("photo_mappings", "[]"))
+        photos = job_photos(photo_mappings, request.files, embed_box, temp_dir)
+
+        @profiled_task
+        def build(template):
+            return build_job_report(template, photos, text_values, project_code, temp_dir, registry)
+
+        try:
+            workers = min(len(templates), app.config["JOB_WORKERS"])
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="atp-job") as executor:
+                reports = list(executor.map(build, templates))
+        finally:
+            if temp_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+        succeeded = [r for r in reports if r["success"]]
+        if succeeded:
+            g.job_id = succeeded[0]["report_id"]
+
+        return (
+            jsonify(
+                {
+                    "success": len(succeeded) == len(reports),
+                    "message": f"Generated {len(succeeded)} of {len(reports)} reports with {len(photos)} photos and {len(text_values)} text fields",
+                    "reports": reports,
+                }
+            ),
+            200 if succeeded else 500,
+        )
+
+    except ImageRejected as e:
+        return jsonify({"error": f"Invalid photo {e}"}), 400
+
+    except Exception as e:
+        import traceback
+
+        print(f"Error in generate_reports: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+
+def report_download_url(record):
+    return f"/reports/{record['report_id']}/download"
+
+
+def report_preview_url(record):
+    return f"/reports/{record['report_id']}/preview"
+
+
+def report_to_json(record):
+    """Public view of an archive record (no server paths)."""
+    return {
+        "report_id": record["report_id"],
+        "project_code": record["project_code"],
+        "site_id": record["site_id"],
+        "template_name": record["template_name"],
+        "template_hash": record["template_hash"],
+        "filename": record["filename"],
+        "size": record["size"],
+        "created_at": record["created_at"],
+        "download_url": report_download_url(record),
+    }
+
+
+@app.route("/reports")
+def list_reports():
+    """
+    List archived reports, newest first.
+    Query: site_id and/or project_code, optional limit (default 50, max 500).
+    """
+    site_id = request.args.get("site_id", "").strip()
+    project_code = request.args.get("project_code", "").strip()
+    if not site_id and not project_code:
+        return jsonify({"error": "Provide site_id or project_code"}), 400
+
+    limit = max(1, min(request.args.get("limit", 50, type=int), 500))
+    records = report_archive.find(site_id=site_id, project_code=project_code, limit=limit)
+
+    return jsonify(
+        {
+            "success": True,
+            "reports": [report_to_json(r) for r in records],
+            "count": len(records),
+        }
+    )
+
+
+@app.route("/reports/<report_id>/download")
+def download_report(report_id):
+    record = report_archive.get(report_id)
+    if not record or not os.path.exists(record["path"]):
+        return jsonify({"error": "Report not found"}), 404
+    return send_file(record["path"], as_attachment=True, download_name=record["filename"])
+
+
+@app.route("/reports/<report_id>/preview")
+def report_preview(report_id):
+    """Cached preview of a report: slot thumbnails and substituted text values."""
+    preview = report_archive.load_preview(report_id)
+    if preview is None:
+        return jsonify({"error": "Preview not found"}), 404
+    return jsonify({**preview, "report_id": report_id, "download_url": f"/reports/{report_id}/download"})
+
+
+@app.route("/reports/<report_id>/edit", methods=["POST"])
+@profiled
+def edit_report(report_id):
+    """
+    Apply a correction to an archived report without regenerating it.
+
+    Form fields are new text values (same names as for upload_photos);
+    photo_mappings + files replace the photos of the given slots. The
+    patched report is archived as a new report.
+    """
+    record = report_archive.get(report_id)
+    manifest = report_archive.load_manifest(report_id)
+    if not record or not manifest or not os.path.exists(record["path"]):
+        return jsonify({"error": "Report not found or cannot be edited"}), 404
+
+    try:
+        check_photos(request.files)
+        patcher = ReportPatcher(manifest, get_registry())
+        text_values = collect_text_values(request.form)
+        if manifest["file_type"] == "excel":
+            photo_embed_size = embed_size(EXCEL_PHOTO_SIZE)
+        else:
+            photo_embed_size = embed_size(DOCX_PHOTO_INCHES, dpi=96)
+
+        photos = {}
+        for mapping in json.loads(request.form.get("photo_mappings", "[]")):
+            photo_file = request.files.get(mapping.get("field_name", ""))
+            if not photo_file or photo_file.filename == "" or not allowed_image(photo_file.filename):
+                continue
+
+            slot_key = patcher.slot_key(mapping)
+            if slot_key is None:
+                return jsonify({"error": f"Unknown photo slot: {mapping}"}), 400
+            photos[slot_key] = open_photo(photo_file, None, photo_embed_size)
+
+        if not text_values and not photos:
+            return jsonify({"error": "Nothing to change"}), 400
+
+        with open(record["path"], "rb") as f:
+            report_bytes = f.read()
+
+        output = io.BytesIO()
+        new_manifest, changes = patcher.apply(
+            report_bytes,
+            text_values,
+            photos,
+            output,
+            compresslevel=app.config["ZIP_COMPRESS_LEVEL"],
+            workers=app.config["ZIP_WORKERS"],
+        )
+
+        new_record = report_archive.add_bytes(
+            output.getbuffer(),
+            record["filename"],
+            project_code=record["project_code"],
+            site_id=new_manifest["text_values"].get("site_id"),
+            template_name=record["template_name"],
+            template_hash=record["template_hash"],
+        )
+        new_manifest["edited_from"] = report_id
+        report_archive.save_manifest(new_record["report_id"], new_manifest)
+        g.job_id = new_record["report_id"]
+
+        preview = build_preview(output, new_manifest, get_registry(), app.config["PREVIEW_THUMB_SIZE"])
+        report_archive.save_preview(new_record["report_id"], preview)
+
+        return jsonify(
+            {
+                "success": True,
+                "message": f"Updated {len(changes['text_fields'])} text fields and {len(changes['photos_replaced']) + len(changes['photos_inserted'])} photos",
+                "download_url": report_download_url(new_record),
+                "report_id": new_record["report_id"],
+                "edited_from": report_id,
+                "changes": changes,
+                "preview_url": report_preview_url(new_record),
+                "preview": preview,
+            }
+        )
+
+    except ImageRejected as e:
+        return jsonify({"error": f"Invalid photo {e}"}), 400
+
+    except Exception as e:
+        import traceback
+
+        print(f"Error in edit_report: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/profiles/<job_id>")
+def list_profile_artifacts(job_id):
+    if not is_profile_admin():
+        return jsonify({"error": "Not found"}), 404
+
+    profile_dir = os.path.join(app.config["PROFILE_DIR"], secure_filename(job_id))
+    if not os.path.isdir(profile_dir):
+        return jsonify({"error": "Not found"}), 404
+
+    return jsonify(
+        {
+            "job_id": job_id,
+            "artifacts": [
+                {"name": name, "url": f"/profiles/{job_id}/{name}"}
+                for name in sorted(os.listdir(profile_dir))
+            ],
+        }
     )
-    return send_file(file_path, as_attachment=True)
+
+
+@app.route("/profiles/<job_id>/<name>")
+def download_profile_artifact(job_id, name):
+    if not is_profile_admin():
+        return jsonify({"error": "Not found"}), 404
+
+    path = os.path.join(app.config["PROFILE_DIR"], secure_filename(job_id), secure_filename(name))
+    if not os.path.isfile(path):
+        return jsonify({"error": "Not found"}), 404
+    return send_file(path, as_attachment=True)
 
 
 if __name__ == "__main__":
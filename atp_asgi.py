@@ -0,0 +1,194 @@
+# atp_asgi.py
+"""
+ASGI entry point for the ATP uploader.
+
+Slow mobile uploads are received on the event loop, so a connection that
+takes a minute to send 40 MB of photos costs a socket and a buffer, not a
+thread. Only once the whole body has arrived is the request handed to the
+Flask app on an executor thread, where template parsing, photo insertion
+and saving run. Responses (including report downloads) are pumped back a
+chunk at a time with the reads on an I/O thread pool, so slow downloads do
+not hold a thread either.
+
+    uvicorn atp_asgi:application --host 0.0.0.0 --port 8000 --workers 4
+
+uvicorn is pinned in requirements.txt (any ASGI server works); the WSGI
+mode (python App.py, gunicorn App:app) keeps working unchanged.
+"""
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.wsgi import FileWrapper
+
+from App import app
+
+_DONE = object()
+
+
+class ASGIAdapter:
+    """
+    Runs a WSGI app under ASGI with non-blocking body reads and response
+    streaming.
+
+    Args:
+        wsgi_app: The Flask app (or any WSGI callable)
+        workers: Threads running request handlers (CPU-bound work)
+        io_workers: Threads doing response chunk reads
+        chunk_size: Read size for file responses (reports, profile artifacts)
+        max_body: Reject bodies larger than this with 413 before reading them
+    """
+
+    def __init__(self, wsgi_app, workers, io_workers=4, chunk_size=256 * 1024, max_body=None):
+        self.wsgi_app = wsgi_app
+        self.chunk_size = chunk_size
+        self.max_body = max_body
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="atp-handler")
+        self.io_executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="atp-io")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.http(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=True)
+                self.io_executor.shutdown(wait=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def http(self, scope, receive, send):
+        headers = [(name.decode("latin-1").lower(), value.decode("latin-1")) for name, value in scope["headers"]]
+        content_length = next((v for k, v in headers if k == "content-length"), None)
+        if self.max_body and content_length and content_length.isdigit() and int(content_length) > self.max_body:
+            await self.send_error(send, 413, b'{"error": "Upload too large"}')
+            return
+
+        body = await self.read_body(receive)
+        if body is None:
+            return  # client went away mid-upload
+        if self.max_body and len(body) > self.max_body:
+            await self.send_error(send, 413, b'{"error": "Upload too large"}')
+            return
+
+        environ = self.build_environ(scope, headers, body)
+        response = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [
+                (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in response_headers
+            ]
+
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self.executor, self.wsgi_app, environ, start_response)
+        try:
+            await self.send_result(loop, result, response, send)
+        finally:
+            if hasattr(result, "close"):
+                await loop.run_in_executor(self.io_executor, result.close)
+
+    async def read_body(self, receive):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            chunk = message.get("body", b"")
+            if chunk:
+                chunks.append(chunk)
+                size += len(chunk)
+                if self.max_body and size > self.max_body:
+                    # Stop buffering; the caller answers 413
+                    return b"".join(chunks)
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    async def send_result(self, loop, result, response, send):
+        iterator = iter(result)
+        # First chunk before the headers: start_response may be deferred until iteration
+        chunk = await loop.run_in_executor(self.io_executor, next, iterator, _DONE)
+        await send({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+
+        while chunk is not _DONE:
+            if chunk:
+                await send({"type": "http.response.body", "body": bytes(chunk), "more_body": True})
+            chunk = await loop.run_in_executor(self.io_executor, next, iterator, _DONE)
+
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def send_error(self, send, status, body):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            }
+        )
+        await send({"type": "http.response.body", "body": body, "more_body": False})
+
+    def file_wrapper(self, file, block_size=8192):
+        # send_file() asks for 8 KB blocks; larger reads mean fewer executor round trips
+        return FileWrapper(file, max(block_size, self.chunk_size))
+
+    def build_environ(self, scope, headers, body):
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            # WSGI carries the raw path bytes as latin-1
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": client[0],
+            "REMOTE_PORT": str(client[1]),
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+            "wsgi.file_wrapper": self.file_wrapper,
+        }
+
+        for name, value in headers:
+            if name == "content-length":
+                continue
+            if name == "content-type":
+                environ["CONTENT_TYPE"] = value
+                continue
+            key = "HTTP_" + name.upper().replace("-", "_")
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+
+        return environ
+
+
+application = ASGIAdapter(
+    app,
+    workers=app.config["ASGI_WORKERS"],
+    io_workers=app.config["ASGI_IO_WORKERS"],
+    chunk_size=app.config["ASGI_STREAM_CHUNK"],
+    max_body=app.config["MAX_CONTENT_LENGTH"],
+)
+
+
+if __name__ == "__main__":
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("ASGI mode needs an ASGI server: pip install uvicorn (or run App.py for the WSGI server)")
+
+    uvicorn.run("atp_asgi:application", host="0.0.0.0", port=8000)
@@ -1,28 +1,16 @@
 # atp_docx_insert.py
 from docx import Document
+from docx.document import Document as DocumentObject
 from docx.shared import Inches, Cm, Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
 import re
 from PIL import Image
 import io
 import os
 
-
-TEXT_PLACEHOLDERS = [
-    "[SK_1]",
-    "[SITE_ID1]",
-    "[SITE_NAME1]",
-    "[SITE_ID]",
-    "[SITE_NAME]",
-    "[HOSTNAME]",
-    "[SCOPE_OF_WORK]",
-    "[DEVICE_TYPE]",
-    "[PROJECT_CODE]",
-    "[DATE]",
-    "[ENGINEER]",
-    "[LOCATION]",
-    "[ADDRESS]",
-]
+from atp_placeholders import get_registry
+from atp_zip_pack import save_document
 
 
 class ATPDocxInserter:
@@ -30,17 +18,37 @@ class ATPDocxInserter:
     Handles photo insertion and text replacement in DOCX ATP templates.
     """
 
-    def __init__(self, docx_path):
+    def __init__(self, docx_path, registry=None, plan=None):
         """
         Initialize with a DOCX template.
 
         Args:
-            docx_path: Path to the DOCX template file
+            docx_path: Path or binary file-like object of the DOCX template, or
+                       an already parsed Document (e.g. from TemplatePool)
+            registry: PlaceholderRegistry, defaults to the shared one
+            plan: Output of get_plan() for the same template, skips detection
         """
         self.docx_path = docx_path
-        self.doc = Document(docx_path)
-        self.photo_mappings = self.detect_photo_placeholders()
-        self.text_mappings = self.detect_text_placeholders()
+        self.registry = registry or get_registry()
+        if isinstance(docx_path, DocumentObject):
+            self.doc = docx_path
+        else:
+            self.doc = Document(docx_path)
+        # Runs holding text placeholders, recorded by replace_all_text()
+        self.text_runs = []
+        if plan:
+            self.photo_mappings = plan["photo_mappings"]
+            self.text_mappings = plan["text_mappings"]
+        else:
+            self.photo_mappings = self.detect_photo_placeholders()
+            self.text_mappings = self.detect_text_placeholders()
+
+    def get_plan(self):
+        """Placeholder locations, JSON-serializable, reusable via plan=."""
+        return {
+            "photo_mappings": self.photo_mappings,
+            "text_mappings": self.text_mappings,
+        }
 
     def detect_photo_placeholders(self):
         """
@@ -50,13 +58,13 @@ class ATPDocxInserter:
         mappings = []
 
         for para_idx, paragraph in enumerate(self.doc.paragraphs):
-            text = paragraph.text.strip()
-            if self.is_photo_placeholder(text):
+            photo = self.registry.photo_placeholder(paragraph.text)
+            if photo:
                 mappings.append({
                     "type": "paragraph",
                     "paragraph_index": para_idx,
-                    "placeholder": text,
-                    "photo_type": self.get_photo_type(text),
+                    "placeholder": photo["placeholder"],
+                    "photo_type": photo["photo_type"],
                     "location": f"Paragraph {para_idx + 1}",
                 })
 
@@ -64,141 +72,61 @@ class ATPDocxInserter:
             for row_idx, row in enumerate(table.rows):
                 for cell_idx, cell in enumerate(row.cells):
                     for para_idx, paragraph in enumerate(cell.paragraphs):
-                        text = paragraph.text.strip()
-                        if self.is_photo_placeholder(text):
+                        photo = self.registry.photo_placeholder(paragraph.text)
+                        if photo:
                             mappings.append({
                                 "type": "table_cell",
                                 "table_index": table_idx,
                                 "row_index": row_idx,
                                 "cell_index": cell_idx,
                                 "paragraph_index": para_idx,
-                                "placeholder": text,
-                                "photo_type": self.get_photo_type(text),
+                                "placeholder": photo["placeholder"],
+                                "photo_type": photo["photo_type"],
                                 "location": f"Table {table_idx + 1}, Cell ({row_idx + 1},{cell_idx + 1})",
                             })
 
         return mappings
 
-    # def detect_text_placeholders(self):
-    #     """Detect text placeholders in the document."""
-    #     mappings = []
-    #     seen = set()
-
-    #     def scan_text(text, location):
-    #         for placeholder in TEXT_PLACEHOLDERS:
-    #             if placeholder in text and placeholder not in seen:
-    #                 seen.add(placeholder)
-                    
-    #                 # Keep the original format for display
-    #                 display_name = placeholder.strip("[]").replace("_", " ").title()
-                    
-    #                 # Create a clean key - KEEP UNDERSCORES for proper matching
-    #                 key = placeholder.strip("[]").lower()
-                    
-    #                 mappings.append({
-    #                     "placeholder": placeholder,
-    #                     "placeholder_key": key,  # Keep underscores (site_id, not siteid)
-    #                     "display_name": display_name,
-    #                     "location": location,
-    #                     "required": key in ["site_id", "site_name", "project_code", 
-    #                                       "sk_1", "site_id1", "site_name1"],
-    #                 })
-
-    #     # Scan paragraphs
-    #     for i, paragraph in enumerate(self.doc.paragraphs):
-    #         scan_text(paragraph.text, f"Paragraph {i + 1}")
-
-    #     # Scan tables
-    #     for t_i, table in enumerate(self.doc.tables):
-    #         for r_i, row in enumerate(table.rows):
-    #             for c_i, cell in enumerate(row.cells):
-    #                 for p_i, paragraph in enumerate(cell.paragraphs):
-    #                     scan_text(
-    #                         paragraph.text,
-    #                         f"Table {t_i + 1}, Cell ({r_i + 1},{c_i + 1})"
-    #                     )
-
-    #     return mappings
+    def detect_text_placeholders(self):
+        """Detect text placeholders in the document."""
+        mappings = []
+        seen = set()
 
+        for paragraph, location in self.iter_paragraphs():
+            for info in self.registry.find_text(paragraph.text):
+                if info["key"] in seen:
+                    continue
+                seen.add(info["key"])
 
-    def detect_text_placeholders(self):
-         """Detect text placeholders in the document."""
-         mappings = []
-         seen = set()
-
-         def scan_text(text, location):
-             for placeholder in TEXT_PLACEHOLDERS:
-                 if placeholder in text and placeholder not in seen:
-                     seen.add(placeholder)
-
-                     # Keep the original format
-                     display_name = placeholder.strip("[]").replace("_", " ").title()
-
-                     # Create a clean key - convert to lowercase
-                     key = placeholder.strip("[]").lower()
-
-                     # Determine if required
-                     required = key in [
-                         "site_id", "site_name", "project_code", 
-                         "sk_1", "site_id1", "site_name1", "date"
-                     ]
-
-                     mappings.append({
-                         "placeholder": placeholder,
-                         "placeholder_key": key,  # 'date', 'engineer', etc.
-                         "display_name": display_name,
-                         "location": location,
-                         "required": required,
-                     })
-
-         # Scan paragraphs
-         for i, paragraph in enumerate(self.doc.paragraphs):
-             scan_text(paragraph.text, f"Paragraph {i + 1}")
-
-         # Scan tables
-         for t_i, table in enumerate(self.doc.tables):
-             for r_i, row in enumerate(table.rows):
-                 for c_i, cell in enumerate(row.cells):
-                     for p_i, paragraph in enumerate(cell.paragraphs):
-                         scan_text(
-                             paragraph.text,
-                             f"Table {t_i + 1}, Cell ({r_i + 1},{c_i + 1})"
-                         )
-
-         return mappings
-    
+                mappings.append({
+                    "placeholder": info["placeholder"],
+                    "placeholder_key": info["key"],  # 'date', 'engineer', etc.
+                    "display_name": info["display_name"],
+                    "location": location,
+                    "required": info["required"],
+                })
+
+        return mappings
+
+    def iter_paragraphs(self):
+        """Yield (paragraph, location) for body paragraphs and table cells."""
+        for i, paragraph in enumerate(self.doc.paragraphs):
+            yield paragraph, f"Paragraph {i + 1}"
+
+        for t_i, table in enumerate(self.doc.tables):
+            for r_i, row in enumerate(table.rows):
+                for c_i, cell in enumerate(row.cells):
+                    for paragraph in cell.paragraphs:
+                        yield paragraph, f"Table {t_i + 1}, Cell ({r_i + 1},{c_i + 1})"
 
     def is_photo_placeholder(self, text):
         """Check if text is a photo placeholder."""
-        photo_placeholders = [
-            "[BEFORE_TOWER1]",
-            "[AFTER_TOWER1]",
-            "[PHOTO_FRONT_SPACE]",
-            "[PHOTO_REAR_SPACE]",
-            "[PHOTO_POWER_CABLE]",
-            "[PHOTO_GROUNDING]",
-            "[PHOTO_CONNECTION]",
-            "[PHOTO]",
-            "[IMAGE]",
-            "[PICTURE]",
-        ]
-        return text.upper() in [p.upper() for p in photo_placeholders]
+        return self.registry.photo_placeholder(text) is not None
 
     def get_photo_type(self, placeholder):
         """Get human-readable photo type from placeholder."""
-        photo_types = {
-            "[BEFORE_TOWER1]": "Before Tower 1",
-            "[AFTER_TOWER1]": "After Tower 1",
-            "[PHOTO_FRONT_SPACE]": "Front Space",
-            "[PHOTO_REAR_SPACE]": "Rear Space",
-            "[PHOTO_POWER_CABLE]": "Power Cable",
-            "[PHOTO_GROUNDING]": "Grounding Cable",
-            "[PHOTO_CONNECTION]": "Connection Router",
-            "[PHOTO]": "Photo",
-            "[IMAGE]": "Image",
-            "[PICTURE]": "Picture",
-        }
-        return photo_types.get(placeholder.upper(), placeholder)
+        photo = self.registry.photo_placeholder(placeholder)
+        return photo["photo_type"] if photo else placeholder
 
     def insert_photo(
         self, mapping_index, photo_path, width_inches=3.0, height_inches=2.0
@@ -208,7 +136,7 @@ class ATPDocxInserter:
 
         Args:
             mapping_index: Index in photo_mappings list
-            photo_path: Path to the photo file
+            photo_path: Path or binary file-like object of the photo
             width_inches: Width of image in inches
             height_inches: Height of image in inches
         """
@@ -218,33 +146,16 @@ class ATPDocxInserter:
         mapping = self.photo_mappings[mapping_index]
 
         try:
-            if mapping["type"] == "paragraph":
-                # Insert photo in paragraph
-                paragraph = self.doc.paragraphs[mapping["paragraph_index"]]
-                # Clear the placeholder text
-                paragraph.clear()
-                # Add the image
-                run = paragraph.add_run()
-                run.add_picture(
-                    photo_path, width=Inches(width_inches), height=Inches(height_inches)
-                )
-                # Center the image
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-            elif mapping["type"] == "table_cell":
-                # Insert photo in table cell
-                table = self.doc.tables[mapping["table_index"]]
-                cell = table.cell(mapping["row_index"], mapping["cell_index"])
-                paragraph = cell.paragraphs[mapping["paragraph_index"]]
-                # Clear the placeholder text
-                paragraph.clear()
-                # Add the image
-                run = paragraph.add_run()
-                run.add_picture(
-                    photo_path, width=Inches(width_inches), height=Inches(height_inches)
-                )
-                # Center the image
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            paragraph = self._slot_paragraph(mapping)
+            # Clear the placeholder text
+            paragraph.clear()
+            # Add the image
+            run = paragraph.add_run()
+            run.add_picture(
+                photo_path, width=Inches(width_inches), height=Inches(height_inches)
+            )
+            # Center the image
+            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
             return True
 
@@ -252,6 +163,28 @@ class ATPDocxInserter:
             print(f"Error inserting photo: {e}")
             return False
 
+    def _slot_paragraph(self, mapping):
+        """Paragraph holding the photo slot described by a photo mapping."""
+        if mapping["type"] == "table_cell":
+            table = self.doc.tables[mapping["table_index"]]
+            cell = table.cell(mapping["row_index"], mapping["cell_index"])
+            return cell.paragraphs[mapping["paragraph_index"]]
+        return self.doc.paragraphs[mapping["paragraph_index"]]
+
+    def photo_media(self):
+        """
+        Media part of the picture in each filled photo slot.
+
+        Returns:
+            dict: Slot index (as str) -> part name, e.g. {"0": "word/media/image1.jpeg"}
+        """
+        media = {}
+        for index, mapping in enumerate(self.photo_mappings):
+            for blip in self._slot_paragraph(mapping)._p.xpath(".//a:blip"):
+                part = self.doc.part.related_parts[blip.get(qn("r:embed"))]
+                media[str(index)] = part.partname.lstrip("/")
+        return media
+
     def replace_text(self, placeholder, replacement_text):
         """
         Replace a specific placeholder with text.
@@ -309,34 +242,32 @@ class ATPDocxInserter:
         Returns:
             dict: Count of replacements per key
         """
+        values = {
+            self.registry.canonical_key(key): value
+            for key, value in text_values.items()
+            if value and isinstance(value, str)
+        }
         replacements = {}
-        
-        for key, value in text_values.items():
-            if not value or not isinstance(value, str):
+
+        # One pass over the document; every [TOKEN] in a run is resolved by the registry.
+        # Each placeholder run is recorded with its template text so a later
+        # edit can re-render just that run.
+        for paragraph_index, (paragraph, _) in enumerate(self.iter_paragraphs()):
+            if "[" not in paragraph.text:
                 continue
 
-            # Convert key to placeholder format
-            # Handle both with and without underscores
-            key_upper = key.upper()
-            
-            # Try different placeholder formats
-            placeholders_to_try = [
-                f"[{key_upper}]",  # [SITE_ID]
-                f"[{key_upper.replace('_', '')}]",  # [SITEID]
-            ]
-            
-            # Also try the original format from TEXT_PLACEHOLDERS
-            for placeholder in TEXT_PLACEHOLDERS:
-                if placeholder.strip('[]').lower() == key.lower():
-                    placeholders_to_try.append(placeholder)
-            
-            # Try each placeholder format
-            for placeholder in set(placeholders_to_try):  # Use set to remove duplicates
-                count = self.replace_text(placeholder, value)
-                if count > 0:
-                    replacements[key] = replacements.get(key, 0) + count
-                    break  # Stop after first successful replacement
-        
+            for run_index, run in enumerate(paragraph.runs):
+                if not self.registry.find_text(run.text):
+                    continue
+                self.text_runs.append(
+                    {"paragraph": paragraph_index, "run": run_index, "template_text": run.text}
+                )
+                new_text, counts = self.registry.substitute(run.text, values)
+                if counts:
+                    run.text = new_text
+                    for key, count in counts.items():
+                        replacements[key] = replacements.get(key, 0) + count
+
         return replacements
 
     def get_available_photo_slots(self):
@@ -379,6 +310,9 @@ class ATPDocxInserter:
 
         return text_fields
 
-    def save(self, output_path):
-        """Save the modified document."""
-        self.doc.save(output_path)
\ No newline at end of file
+    def save(self, output_path, **pack_options):
+        """
+        Save the modified document. Photos are stored, XML is deflated; see
+        atp_zip_pack.write_zip for pack_options (compresslevel, workers).
+        """
+        save_document(self.doc, output_path, **pack_options)
\ No newline at end of file
@@ -0,0 +1,142 @@
+# atp_image_intake.py
+import io
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Formats the processors can embed as-is (matches IMAGE_EXTENSIONS in App.py)
+ALLOWED_FORMATS = {"JPEG", "PNG", "GIF"}
+# Anything larger is not a phone photo (and a likely decompression bomb)
+MAX_PIXELS = 80_000_000
+JPEG_QUALITY = 85
+
+# EXIF orientations that swap width and height
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+class ImageRejected(ValueError):
+    """Upload is not a usable photo (corrupt, disguised, unsupported or too large)."""
+
+
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+
+def probe_image(source):
+    """
+    Validate a photo from its header only - nothing is decoded.
+
+    Args:
+        source: Path or seekable binary file-like object (left rewound)
+
+    Returns:
+        dict: format ("JPEG", "PNG", "GIF"), width, height
+
+    Raises:
+        ImageRejected: Not an image, not an allowed format, or too many pixels
+    """
+    _rewind(source)
+    try:
+        with Image.open(source) as img:
+            image_format, (width, height) = img.format, img.size
+    except UnidentifiedImageError as e:
+        raise ImageRejected("not a recognised image file") from e
+    except (Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise ImageRejected(f"unreadable image header ({e})") from e
+    finally:
+        _rewind(source)
+
+    if image_format not in ALLOWED_FORMATS:
+        raise ImageRejected(f"unsupported image format {image_format}")
+    if not width or not height or width * height > MAX_PIXELS:
+        raise ImageRejected(f"unsupported image size {width}x{height}")
+
+    return {"format": image_format, "width": width, "height": height}
+
+
+def prepare_image(source, max_size=None):
+    """
+    Photo ready to embed, no larger than max_size.
+
+    Photos already within max_size (and all GIFs) are returned untouched.
+    Larger JPEGs are decoded with the decoder's DCT scaling (draft), so a
+    4000x3000 photo is decoded at 1/2, 1/4 or 1/8 size instead of in full,
+    then downscaled to fit max_size, turned upright per EXIF orientation
+    and re-encoded.
+
+    Args:
+        source: Path or seekable binary file-like object
+        max_size: (width, height) box in pixels, None to keep the original
+
+    Returns:
+        Path or binary file-like object positioned at 0
+
+    Raises:
+        ImageRejected: As probe_image(), or if the image data is corrupt
+    """
+    info = probe_image(source)
+    if (
+        not max_size
+        or info["format"] == "GIF"
+        or (info["width"] <= max_size[0] and info["height"] <= max_size[1])
+    ):
+        return source
+
+    try:
+        with Image.open(source) as img:
+            orientation = img.getexif().get(0x0112, 1)
+            box = max_size[::-1] if orientation in _TRANSPOSED_ORIENTATIONS else max_size
+            if info["format"] == "JPEG":
+                # Picks the largest DCT scale that still covers the box
+                img.draft("RGB", box)
+
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail(max_size, Image.LANCZOS)
+
+            out = io.BytesIO()
+            if info["format"] == "JPEG":
+                if img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                img.save(out, "JPEG", quality=JPEG_QUALITY)
+            else:
+                img.save(out, "PNG")
+    except (OSError, SyntaxError, ValueError) as e:
+        raise ImageRejected(f"corrupt image data ({e})") from e
+    finally:
+        _rewind(source)
+
+    out.seek(0)
+    return out
+
+
+def make_thumbnail(source, size, quality=70):
+    """
+    Small upright JPEG of an image for previews, decoded scaled like
+    prepare_image(). Transparent areas are flattened onto white.
+
+    Args:
+        source: Path or seekable binary file-like object
+        size: (width, height) box in pixels
+
+    Returns:
+        bytes: JPEG data
+    """
+    _rewind(source)
+    with Image.open(source) as img:
+        if img.format == "JPEG":
+            img.draft("RGB", size)
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail(size)
+
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, "white")
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        elif img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+
+        out = io.BytesIO()
+        img.save(out, "JPEG", quality=quality)
+    _rewind(source)
+    return out.getvalue()
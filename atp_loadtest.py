@@ -0,0 +1,318 @@
+# atp_loadtest.py
+"""
+Load generator for the ATP uploader.
+
+Replays field-crew sessions (analyze template -> upload N photos -> download
+report) against a running instance and reports throughput, latency
+percentiles, error rates and server RSS.
+
+    python atp_loadtest.py --template master.xlsx --concurrency 16 --sessions 200 \\
+        --photos 6 --photo-size 2000x1500 --server-pid $(pgrep -f App.py)
+"""
+import argparse
+import io
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+STEPS = ("analyze", "upload", "download", "session")
+
+
+def make_photo(width, height, quality=85, seed=None):
+    """
+    Noise JPEG, so the encoded size is close to a real phone photo rather
+    than the few KB a flat colour would compress to.
+    """
+    rng = random.Random(seed)
+    # Small noise tile upscaled keeps generation fast for 4000x3000 photos
+    tile = Image.frombytes("RGB", (width // 8 or 1, height // 8 or 1), rng.randbytes((width // 8 or 1) * (height // 8 or 1) * 3))
+    img = tile.resize((width, height), Image.BILINEAR)
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def encode_multipart(fields, files):
+    """
+    Args:
+        fields: Dict of form field name -> str
+        files: List of (field name, filename, bytes, content type)
+
+    Returns:
+        tuple: (body bytes, content type header)
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for name, filename, data, content_type in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n".encode()
+            + data
+            + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def template_content_type(filename):
+    if filename.lower().endswith(".docx"):
+        return "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    return "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class RSSSampler(threading.Thread):
+    """Polls VmRSS of the given PIDs (summed) from /proc while the test runs."""
+
+    def __init__(self, pids, interval=0.5):
+        super().__init__(daemon=True)
+        self.pids = pids
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def read_rss(self):
+        total = 0
+        for pid in self.pids:
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total += int(line.split()[1]) * 1024
+                            break
+            except OSError:
+                pass
+        return total
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.samples.append(self.read_rss())
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.samples.append(self.read_rss())
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.base_url = args.url.rstrip("/")
+        with open(args.template, "rb") as f:
+            self.template_bytes = f.read()
+        self.template_name = os.path.basename(args.template)
+
+        width, height = (int(v) for v in args.photo_size.lower().split("x"))
+        # A few distinct photos per run, reused across sessions
+        self.photos = [make_photo(width, height, args.photo_quality, seed=i) for i in range(min(args.photos, 4) or 1)]
+
+        self.lock = threading.Lock()
+        self.latencies = {step: [] for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+        self.error_samples = []
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def request(self, method, path, body=None, content_type=None):
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        if content_type:
+            req.add_header("Content-Type", content_type)
+        with urllib.request.urlopen(req, timeout=self.args.timeout) as resp:
+            return resp.read()
+
+    def timed(self, step, func):
+        start = time.perf_counter()
+        try:
+            result = func()
+        except Exception as e:
+            with self.lock:
+                self.errors[step] += 1
+                if len(self.error_samples) < 10:
+                    detail = e.read()[:200].decode(errors="replace") if isinstance(e, urllib.error.HTTPError) else ""
+                    self.error_samples.append(f"{step}: {e} {detail}".strip())
+            raise
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.latencies[step].append(elapsed)
+        return result
+
+    def session(self, session_index):
+        session_start = time.perf_counter()
+        try:
+            template_file = [("excel_file", self.template_name, self.template_bytes, template_content_type(self.template_name))]
+
+            body, content_type = encode_multipart({}, template_file)
+            sent = len(body)
+            analysis = json.loads(
+                self.timed("analyze", lambda: self.request("POST", "/analyze_template", body, content_type))
+            )
+            slots = analysis.get("photo_slots", [])
+            if not slots:
+                raise RuntimeError("template has no photo slots")
+
+            mappings = []
+            files = list(template_file)
+            for i in range(self.args.photos):
+                slot_index = i % len(slots)
+                slot = slots[slot_index]
+                mapping = {
+                    "field_name": f"photo_{i}",
+                    "slot_index": slot.get("slot_index", slot_index),
+                    "photo_type": slot.get("type"),
+                }
+                if "sheet" in slot:
+                    mapping.update(sheet=slot["sheet"], target_cell=slot["target_cell"])
+                mappings.append(mapping)
+                files.append((f"photo_{i}", f"photo_{i}.jpg", self.photos[i % len(self.photos)], "image/jpeg"))
+
+            fields = {
+                "project_code": "LOADTEST",
+                "photo_mappings": json.dumps(mappings),
+                "site_id": f"LT-{session_index:05d}",
+                "site_name": "Load Test Site",
+                "date": time.strftime("%d/%m/%Y"),
+            }
+            body, content_type = encode_multipart(fields, files)
+            sent += len(body)
+            result = json.loads(self.timed("upload", lambda: self.request("POST", "/upload_photos", body, content_type)))
+            if not result.get("success"):
+                raise RuntimeError(result.get("error", "upload failed"))
+
+            report = self.timed("download", lambda: self.request("GET", result["download_url"]))
+
+            with self.lock:
+                self.bytes_sent += sent
+                self.bytes_received += len(report)
+                self.latencies["session"].append(time.perf_counter() - session_start)
+        except Exception:
+            with self.lock:
+                self.errors["session"] += 1
+
+    def run(self):
+        sampler = RSSSampler(self.args.server_pid) if self.args.server_pid else None
+        if sampler:
+            sampler.start()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            list(pool.map(self.session, range(self.args.sessions)))
+        elapsed = time.perf_counter() - start
+
+        if sampler:
+            sampler.stop()
+
+        return self.summary(elapsed, sampler)
+
+    def summary(self, elapsed, sampler):
+        completed = len(self.latencies["session"])
+        report = {
+            "sessions": self.args.sessions,
+            "completed": completed,
+            "concurrency": self.args.concurrency,
+            "photos_per_session": self.args.photos,
+            "photo_bytes": len(self.photos[0]),
+            "elapsed_s": round(elapsed, 3),
+            "sessions_per_s": round(completed / elapsed, 3) if elapsed else 0,
+            "upload_mb_per_s": round(self.bytes_sent / elapsed / 1e6, 3) if elapsed else 0,
+            "download_mb_per_s": round(self.bytes_received / elapsed / 1e6, 3) if elapsed else 0,
+            "steps": {},
+            "errors": self.errors,
+            "error_rate": round(self.errors["session"] / self.args.sessions, 4) if self.args.sessions else 0,
+            "error_samples": self.error_samples,
+        }
+        for step in STEPS:
+            report["steps"][step] = latency_stats(self.latencies[step])
+        if sampler and sampler.samples:
+            report["server_rss_mb"] = {
+                "start": round(sampler.samples[0] / 1e6, 1),
+                "peak": round(max(sampler.samples) / 1e6, 1),
+                "end": round(sampler.samples[-1] / 1e6, 1),
+            }
+        return report
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def latency_stats(values):
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    ms = lambda v: round(v * 1000, 1)  # noqa: E731
+    return {
+        "count": len(values),
+        "mean_ms": ms(sum(values) / len(values)),
+        "p50_ms": ms(percentile(values, 50)),
+        "p90_ms": ms(percentile(values, 90)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1]),
+    }
+
+
+def print_report(report):
+    print(
+        f"{report['completed']}/{report['sessions']} sessions in {report['elapsed_s']}s "
+        f"at concurrency {report['concurrency']} ({report['photos_per_session']} photos, "
+        f"{report['photo_bytes'] / 1024:.0f} KB each)"
+    )
+    print(
+        f"throughput: {report['sessions_per_s']} sessions/s, "
+        f"upload {report['upload_mb_per_s']} MB/s, download {report['download_mb_per_s']} MB/s"
+    )
+    print(f"{'step':<10}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for step, stats in report["steps"].items():
+        print(
+            f"{step:<10}{stats['count']:>7}{report['errors'][step]:>8}"
+            f"{stats.get('p50_ms', '-'):>10}{stats.get('p90_ms', '-'):>10}"
+            f"{stats.get('p99_ms', '-'):>10}{stats.get('max_ms', '-'):>10}"
+        )
+    print(f"error rate: {report['error_rate'] * 100:.2f}%")
+    if "server_rss_mb" in report:
+        rss = report["server_rss_mb"]
+        print(f"server RSS MB: start {rss['start']}, peak {rss['peak']}, end {rss['end']}")
+    for sample in report["error_samples"]:
+        print(f"  ! {sample}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent field crews against the ATP uploader")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="Base URL of a running instance")
+    parser.add_argument("--template", required=True, help="Template (.xlsx/.docx) each session uploads")
+    parser.add_argument("--concurrency", type=int, default=8, help="Sessions in flight at once")
+    parser.add_argument("--sessions", type=int, default=50, help="Total sessions to run")
+    parser.add_argument("--photos", type=int, default=4, help="Photos uploaded per session")
+    parser.add_argument("--photo-size", default="2000x1500", help="Generated photo size, WxH")
+    parser.add_argument("--photo-quality", type=int, default=85, help="JPEG quality of generated photos")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds")
+    parser.add_argument("--server-pid", type=int, action="append", help="Server PID to sample RSS from (repeatable)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = LoadTest(args).run()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0 if report["errors"]["session"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
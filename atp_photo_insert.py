@@ -1,148 +1,116 @@
 # atp_photo_insert.py
 import openpyxl
 from openpyxl.drawing.image import Image
+from openpyxl.utils import get_column_letter
 import os
-import re
-
-# Photo placeholder mappings
-PHOTO_PLACEHOLDERS = {
-    "[PHOTO_FRONT_VIEW]": "Front View",
-    "[PHOTO_REAR_VIEW]": "Rear View",
-    "[PHOTO_FRONT_SPACE]": "Front Space",
-    "[PHOTO_REAR_SPACE]": "Rear Space",
-    "[PHOTO_POWER_CABLE]": "Power Cable",
-    "[PHOTO_GROUNDING]": "Grounding Cable",
-    "[PHOTO_CONNECTION]": "Connection Router",
-}
-
-# NEW: Text placeholder patterns - we'll use regex to detect various patterns
-TEXT_PLACEHOLDER_PATTERNS = [
-    r"\[SITE_?ID\]",  # [SITE_ID] or [SITEID]
-    r"\[SITE_?NAME\]",  # [SITE_NAME] or [SITENAME]
-    r"\[HOSTNAME\]",
-    r"\[SCOPE_?OF_?WORK\]",  # [SCOPE_OF_WORK] or [SCOPEOFWORK]
-    r"\[DEVICE_?TYPE\]",  # [DEVICE_TYPE] or [DEVICETYPE]
-    r"\[PROJECT_?CODE\]",
-    r"\[DATE\]",
-    r"\[ENGINEER\]",
-    r"\[LOCATION\]",
-    r"\[ADDRESS\]",
-    r"\[CITY\]",
-    r"\[STATE\]",
-    r"\[ZIP\]",
-    r"\[COUNTRY\]",
-    # Add more patterns as needed
-]
-
-# NEW: Mapping for clean display names
-TEXT_PLACEHOLDER_DISPLAY_NAMES = {
-    "[SK_1]" : "Systemkey 1",
-    "[SITE_ID1]" : "SITE ID 1",
-    "[SITE_NAME1]" : "SITE NAME 1",
-    "[SITE_ID]": "Site ID",
-    "[SITEID]": "Site ID",
-    "[SITE_NAME]": "Site Name",
-    "[SITENAME]": "Site Name",
-    "[HOSTNAME]": "Hostname",
-    "[SCOPE_OF_WORK]": "Scope of Work",
-    "[SCOPEOFWORK]": "Scope of Work",
-    "[DEVICE_TYPE]": "Device Type",
-    "[DEVICETYPE]": "Device Type",
-    "[PROJECT_CODE]": "Project Code",
-    "[PROJECTCODE]": "Project Code",
-    "[DATE]": "Date",
-    "[ENGINEER]": "Engineer",
-    "[LOCATION]": "Location",
-    "[ADDRESS]": "Address",
-    "[CITY]": "City",
-    "[STATE]": "State",
-    "[ZIP]": "ZIP Code",
-    "[COUNTRY]": "Country",
-}
 
+from atp_placeholders import get_registry
+from atp_zip_pack import save_workbook
+
+
+def collect_cell_placeholders(registry, sheet_name, coordinate, value, photo_mappings, text_mappings):
+    """
+    Classify one string cell and append its photo or text mappings.
+    Shared by the openpyxl scan and the sheet-parallel XML scan so both
+    produce identical plans.
+    """
+    photo = registry.photo_placeholder(value)
+    if photo:
+        photo_mappings.append(
+            {
+                "sheet": sheet_name,
+                "photo_type": photo["photo_type"],
+                "placeholder": photo["placeholder"],
+                "photo_cell": coordinate,
+            }
+        )
+        return
+
+    for info in registry.find_text(value, formula=True):
+        text_mappings.append(
+            {
+                "sheet": sheet_name,
+                "placeholder": info["placeholder"],
+                "display_name": info["display_name"],
+                "placeholder_key": info["key"],
+                "target_cell": coordinate,
+                "current_value": value,
+                "description": f"Found in {sheet_name}, cell {coordinate}",
+            }
+        )
 
-class ATPPhotoInserter:
-    def __init__(self, excel_path):
-        self.wb = openpyxl.load_workbook(excel_path)
-        self.photo_mappings = self.detect_photo_placeholders()
-        # NEW: Detect text placeholders
-        self.text_mappings = self.detect_text_placeholders()
-
-    def detect_photo_placeholders(self):
-        """Detect photo placeholder cells in the Excel template."""
-        mappings = []
 
-        for sheet_name in self.wb.sheetnames:
-            ws = self.wb[sheet_name]
+class ATPPhotoInserter:
+    def __init__(self, excel_path, registry=None, plan=None):
+        """
+        Args:
+            excel_path: Path or binary file-like object of the template, or
+                        an already parsed Workbook (e.g. from TemplatePool)
+            registry: PlaceholderRegistry, defaults to the shared one
+            plan: Output of get_plan() for the same template, skips detection
+        """
+        self.registry = registry or get_registry()
+        if isinstance(excel_path, openpyxl.Workbook):
+            self.wb = excel_path
+        else:
+            self.wb = openpyxl.load_workbook(excel_path)
+        if plan:
+            self.photo_mappings = plan["photo_mappings"]
+            self.text_mappings = plan["text_mappings"]
+        else:
+            self.photo_mappings, self.text_mappings = self.scan_placeholders()
+
+    @classmethod
+    def from_plan(cls, plan, registry=None):
+        """
+        Inserter over an existing plan without loading the workbook, for
+        building the analysis response (slots, text fields). wb is None.
+        """
+        inserter = cls.__new__(cls)
+        inserter.registry = registry or get_registry()
+        inserter.wb = None
+        inserter.photo_mappings = plan["photo_mappings"]
+        inserter.text_mappings = plan["text_mappings"]
+        return inserter
+
+    def get_plan(self):
+        """Placeholder locations, JSON-serializable, reusable via plan=."""
+        return {
+            "photo_mappings": self.photo_mappings,
+            "text_mappings": self.text_mappings,
+        }
 
-            for row in ws.iter_rows():
-                for cell in row:
-                    if cell.value and isinstance(cell.value, str):
-                        text = str(cell.value).strip().replace("\xa0", "")
-
-                        if text in PHOTO_PLACEHOLDERS:
-                            mappings.append(
-                                {
-                                    "sheet": sheet_name,
-                                    "photo_type": PHOTO_PLACEHOLDERS[text],
-                                    "placeholder": text,
-                                    "photo_cell": cell.coordinate,
-                                }
-                            )
-
-        return mappings
-
-    # NEW: Method to detect text placeholders
-    def detect_text_placeholders(self):
+    def scan_placeholders(self):
         """
-        Detect text placeholder cells in the Excel template.
-        Uses regex patterns to find various placeholder formats.
+        Single pass over every string cell, collecting photo and text
+        placeholders with the shared registry.
+
+        Returns:
+            tuple: (photo_mappings, text_mappings)
         """
-        mappings = []
+        photo_mappings = []
+        text_mappings = []
 
         for sheet_name in self.wb.sheetnames:
             ws = self.wb[sheet_name]
 
             for row in ws.iter_rows():
                 for cell in row:
-                    if cell.value and isinstance(cell.value, str):
-                        cell_text = str(cell.value).strip().replace("\xa0", "")
-
-                        # Check if the cell text matches any text placeholder pattern
-                        for pattern in TEXT_PLACEHOLDER_PATTERNS:
-                            match = re.search(pattern, cell_text, re.IGNORECASE)
-                            if match:
-                                placeholder_text = match.group(
-                                    0
-                                ).upper()  # Get the matched text
-
-                                # Get a clean display name
-                                display_name = TEXT_PLACEHOLDER_DISPLAY_NAMES.get(
-                                    placeholder_text,
-                                    placeholder_text.strip("[]")
-                                    .replace("_", " ")
-                                    .title(),
-                                )
-
-                                # Generate a key for the placeholder (used in form submission)
-                                # Convert [SITE_ID] to 'site_id'
-                                placeholder_key = placeholder_text.strip("[]").lower()
-
-                                mappings.append(
-                                    {
-                                        "sheet": sheet_name,
-                                        "placeholder": placeholder_text,
-                                        "display_name": display_name,
-                                        "placeholder_key": placeholder_key,
-                                        "target_cell": cell.coordinate,
-                                        "current_value": cell.value,
-                                        "description": f"Found in {sheet_name}, cell {cell.coordinate}",
-                                    }
-                                )
-                                # Break after first match to avoid duplicates
-                                break
-
-        return mappings
+                    if not isinstance(cell.value, str) or "[" not in cell.value:
+                        continue
+                    collect_cell_placeholders(
+                        self.registry, sheet_name, cell.coordinate, cell.value, photo_mappings, text_mappings
+                    )
+
+        return photo_mappings, text_mappings
+
+    def detect_photo_placeholders(self):
+        """Photo placeholder cells in the Excel template (from the one scan or plan)."""
+        return self.photo_mappings
+
+    def detect_text_placeholders(self):
+        """Text placeholder cells in the Excel template (from the one scan or plan)."""
+        return self.text_mappings
 
     def get_available_photo_slots(self):
         """Get photo slots information for frontend display."""
@@ -198,20 +166,8 @@ class ATPPhotoInserter:
 
     # NEW: Helper method to determine if a field is required
     def is_field_required(self, placeholder_key):
-        """
-        Determine if a field should be marked as required.
-        You can customize this logic based on your needs.
-        """
-        required_fields = {
-            "site_id",
-            "siteid",
-            "site_name",
-            "sitename",
-            "project_code",
-            "projectcode",
-        }
-
-        return placeholder_key in required_fields
+        """Required flags live in the placeholder registry config."""
+        return self.registry.is_required(placeholder_key)
 
     # Rest of the existing methods remain the same...
     def insert_photo_by_placeholder(
@@ -247,8 +203,31 @@ class ATPPhotoInserter:
         ws.add_image(img)
         return True
 
-    def save(self, output_path):
-        self.wb.save(output_path)
+    def photo_media(self):
+        """
+        Media part of every image in the workbook, keyed "Sheet!A1" by the
+        anchor cell. Part names are assigned when saving, so call after save().
+
+        Returns:
+            dict: e.g. {"Photos!B4": "xl/media/image1.jpeg"}
+        """
+        media = {}
+        for ws in self.wb.worksheets:
+            for img in ws._images:
+                anchor = img.anchor
+                if not isinstance(anchor, str):
+                    # Images read back from an existing report carry anchor objects
+                    marker = anchor._from
+                    anchor = f"{get_column_letter(marker.col + 1)}{marker.row + 1}"
+                media[f"{ws.title}!{anchor}"] = img.path.lstrip("/")
+        return media
+
+    def save(self, output_path, **pack_options):
+        """
+        Save the workbook. Photos are stored, XML is deflated; see
+        atp_zip_pack.write_zip for pack_options (compresslevel, workers).
+        """
+        save_workbook(self.wb, output_path, **pack_options)
 
 
 
@@ -0,0 +1,212 @@
+# atp_placeholders.py
+import hashlib
+import json
+import os
+import re
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "placeholders.json")
+
+# Any [TOKEN] in a template. \s also covers the \xa0 that Excel/Word like to insert.
+TOKEN_PATTERN = re.compile(r"\[\s*([A-Za-z0-9_]+)\s*\]")
+# String literal inside a spreadsheet formula ("" is an escaped quote)
+FORMULA_STRING_PATTERN = re.compile(r'"(?:[^"]|"")*"')
+
+
+class PlaceholderRegistry:
+    """
+    Single source of truth for [TOKEN] placeholders used by every processor.
+
+    Known tokens come from the config file. Anything else written in upper case
+    (e.g. [TECHNICIAN]) is discovered generically: tokens starting with one of
+    the photo prefixes become photo slots, the rest become text fields.
+    """
+
+    def __init__(self, config):
+        # Identifies this config; cached placeholder plans are only reused under the same one
+        self.fingerprint = hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+        self.photo_prefixes = tuple(p.upper() for p in config.get("photo_prefixes", []))
+        self.photo_types = {token.upper(): name for token, name in config.get("photo", {}).items()}
+
+        self.text_fields = {}
+        self.aliases = {}
+        for key, spec in config.get("text", {}).items():
+            key = key.lower()
+            self.text_fields[key] = {
+                "display_name": spec.get("display_name", key.replace("_", " ").title()),
+                "required": bool(spec.get("required", False)),
+            }
+            self.aliases[key.upper()] = key
+            for alias in spec.get("aliases", []):
+                self.aliases[alias.upper()] = key
+
+        self._classified = {}
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def classify(self, token):
+        """
+        Classify a bare token (no brackets).
+
+        Returns a dict with kind ("photo" or "text"), placeholder, key,
+        display_name and required, or None if the token is not a placeholder.
+        """
+        if token in self._classified:
+            return self._classified[token]
+
+        upper = token.upper()
+        info = None
+
+        if upper in self.photo_types:
+            info = self._photo_info(upper, self.photo_types[upper])
+        elif upper in self.aliases:
+            info = self._text_info(upper, self.aliases[upper])
+        elif token == upper and any(c.isalpha() for c in token):
+            # Generic discovery - only for tokens written in upper case so that
+            # ordinary bracketed prose like [note] is left alone
+            if upper.startswith(self.photo_prefixes):
+                info = self._photo_info(upper, self._derive_photo_type(upper))
+            else:
+                info = self._text_info(upper, upper.lower())
+
+        self._classified[token] = info
+        return info
+
+    def _photo_info(self, token, photo_type):
+        return {
+            "kind": "photo",
+            "placeholder": f"[{token}]",
+            "key": token.lower(),
+            "photo_type": photo_type,
+            "display_name": photo_type,
+            "required": False,
+        }
+
+    def _text_info(self, token, key):
+        field = self.text_fields.get(key, {})
+        return {
+            "kind": "text",
+            "placeholder": f"[{token}]",
+            "key": key,
+            "display_name": field.get("display_name", key.replace("_", " ").title()),
+            "required": field.get("required", False),
+        }
+
+    def _derive_photo_type(self, token):
+        """[PHOTO_ANTENNA_MOUNT] -> 'Antenna Mount', [BEFORE_TOWER2] -> 'Before Tower2'."""
+        if token.startswith("PHOTO_"):
+            token = token[len("PHOTO_"):]
+        return token.replace("_", " ").strip().title()
+
+    def find(self, text, formula=False):
+        """
+        Return classification dicts for every placeholder found in text.
+
+        With formula=True, text is a spreadsheet cell value: in "="-prefixed
+        values only the formula's string literals are searched, so structured
+        references like Sales[AMOUNT] are not taken for placeholders.
+        """
+        if not text or "[" not in text:
+            return []
+        if formula and text.startswith("="):
+            return [info for literal in FORMULA_STRING_PATTERN.findall(text) for info in self.find(literal)]
+
+        found = []
+        for match in TOKEN_PATTERN.finditer(text):
+            info = self.classify(match.group(1))
+            if info:
+                found.append(info)
+        return found
+
+    def find_text(self, text, formula=False):
+        """Text placeholders in text, photo tokens ignored. formula as in find()."""
+        return [info for info in self.find(text, formula) if info["kind"] == "text"]
+
+    def photo_placeholder(self, text):
+        """
+        Return the photo classification if text consists solely of a photo
+        placeholder (surrounding whitespace ignored), else None.
+        """
+        if not text or "[" not in text:
+            return None
+
+        match = TOKEN_PATTERN.fullmatch(text.strip())
+        if not match:
+            return None
+
+        info = self.classify(match.group(1))
+        if info and info["kind"] == "photo":
+            return info
+        return None
+
+    def canonical_key(self, key):
+        """
+        Normalise a form / mapping key to the canonical text key.
+        'siteid', 'text_SITE_ID' and 'SITE_ID' all become 'site_id'.
+        """
+        key = key.strip()
+        if key.lower().startswith("text_"):
+            key = key[len("text_"):]
+        return self.aliases.get(key.upper(), key.lower())
+
+    def is_required(self, key):
+        return self.text_fields.get(self.canonical_key(key), {}).get("required", False)
+
+    def substitute(self, text, values, formula=False):
+        """
+        Replace every known text placeholder in text with its value.
+
+        Args:
+            text: Source string
+            values: Dict of canonical key -> replacement value
+            formula: Text is a spreadsheet cell value; in formulas only
+                string literals are substituted (see find())
+
+        Returns:
+            tuple: (new_text, {key: replacement count})
+        """
+        counts = {}
+        if not text or "[" not in text:
+            return text, counts
+
+        if formula and text.startswith("="):
+            # Values land inside "..." literals, so their quotes are doubled
+            escaped = {key: None if value is None else str(value).replace('"', '""') for key, value in values.items()}
+
+            def replace_literal(match):
+                literal, literal_counts = self.substitute(match.group(0), escaped)
+                for key, count in literal_counts.items():
+                    counts[key] = counts.get(key, 0) + count
+                return literal
+
+            return FORMULA_STRING_PATTERN.sub(replace_literal, text), counts
+
+        def replace(match):
+            info = self.classify(match.group(1))
+            if not info or info["kind"] != "text":
+                return match.group(0)
+
+            value = values.get(info["key"])
+            if value is None or value == "":
+                return match.group(0)
+
+            counts[info["key"]] = counts.get(info["key"], 0) + 1
+            return str(value)
+
+        return TOKEN_PATTERN.sub(replace, text), counts
+
+
+_registry = None
+
+
+def get_registry():
+    """
+    Shared registry, loaded once from ATP_PLACEHOLDER_CONFIG or placeholders.json.
+    """
+    global _registry
+    if _registry is None:
+        path = os.environ.get("ATP_PLACEHOLDER_CONFIG", DEFAULT_CONFIG_PATH)
+        _registry = PlaceholderRegistry.from_file(path)
+    return _registry
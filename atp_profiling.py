@@ -0,0 +1,120 @@
+# atp_profiling.py
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+# tracemalloc is process-wide, so only one request is profiled at a time
+_profile_lock = threading.Lock()
+
+
+class RequestProfiler:
+    """
+    CPU profile + tracemalloc snapshot for the code run inside the with-block.
+
+        with RequestProfiler() as profiler:
+            handle_request()
+        profiler.write(job_dir, "upload_photos")
+
+    Nothing here is touched unless a request opted in, so the cost when
+    profiling is off is the check that decides not to use it.
+    """
+
+    def __init__(self, trace_frames=10):
+        self.trace_frames = trace_frames
+        self.profile = cProfile.Profile()
+        self.thread_profiles = []
+        self._threads_lock = threading.Lock()
+        self.snapshot = None
+        self.peak_bytes = 0
+        self.wall_time = 0.0
+
+    def __enter__(self):
+        _profile_lock.acquire()
+        tracemalloc.start(self.trace_frames)
+        self._start = time.perf_counter()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.profile.disable()
+            self.wall_time = time.perf_counter() - self._start
+            self.snapshot = tracemalloc.take_snapshot()
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+            _profile_lock.release()
+        return False
+
+    @contextlib.contextmanager
+    def thread(self):
+        """
+        Also profile the block when it runs on a worker thread; cProfile
+        only sees the thread that enabled it. Worker pools of a profiled
+        request wrap their tasks in this.
+        """
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ profiles every thread already (one profiler per process)
+            yield
+            return
+
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._threads_lock:
+                self.thread_profiles.append(profile)
+
+    def stats(self, stream=None):
+        """pstats.Stats of the request thread and every profiled worker thread."""
+        return pstats.Stats(self.profile, *self.thread_profiles, stream=stream)
+
+    def cpu_report(self, limit=60):
+        out = io.StringIO()
+        self.stats(out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+    def memory_report(self, limit=30):
+        snapshot = self.snapshot.filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            )
+        )
+        lines = [
+            f"wall time: {self.wall_time:.3f}s",
+            f"peak traced memory: {self.peak_bytes / 1024 / 1024:.1f} MB",
+            "",
+            f"top {limit} allocation sites (live at end of request):",
+        ]
+        for stat in snapshot.statistics("lineno")[:limit]:
+            lines.append(f"  {stat}")
+
+        lines += ["", "by file:"]
+        for stat in snapshot.statistics("filename")[:15]:
+            lines.append(f"  {stat}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory, name):
+        """
+        Write <name>.prof (pstats, for snakeviz etc.), <name>.cpu.txt and
+        <name>.mem.txt into directory.
+
+        Returns:
+            list: Artifact filenames written
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.stats().dump_stats(os.path.join(directory, f"{name}.prof"))
+        with open(os.path.join(directory, f"{name}.cpu.txt"), "w") as f:
+            f.write(self.cpu_report())
+        with open(os.path.join(directory, f"{name}.mem.txt"), "w") as f:
+            f.write(self.memory_report())
+        return [f"{name}.prof", f"{name}.cpu.txt", f"{name}.mem.txt"]
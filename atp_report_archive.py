@@ -0,0 +1,187 @@
+# atp_report_archive.py
+import contextlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    report_id     TEXT PRIMARY KEY,
+    project_code  TEXT,
+    site_id       TEXT,
+    template_name TEXT,
+    template_hash TEXT,
+    filename      TEXT NOT NULL,
+    path          TEXT NOT NULL,
+    size          INTEGER NOT NULL,
+    created_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reports_site ON reports (site_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_reports_project ON reports (project_code, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_reports_template ON reports (template_hash);
+"""
+
+COLUMNS = (
+    "report_id",
+    "project_code",
+    "site_id",
+    "template_name",
+    "template_hash",
+    "filename",
+    "path",
+    "size",
+    "created_at",
+)
+
+# Job manifest kept next to each report file, used to patch it later
+MANIFEST_NAME = "job.json"
+PREVIEW_NAME = "preview.json"
+
+
+class ReportArchive:
+    """
+    Persistent store for generated reports.
+
+    Files live under <root>/files/<report_id>/, metadata in <root>/reports.sqlite3
+    indexed by site_id, project_code and template hash.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.files_dir = os.path.join(root, "files")
+        self.db_path = os.path.join(root, "reports.sqlite3")
+        os.makedirs(self.files_dir, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps this safe across request threads;
+        # committed (or rolled back) and closed when the block ends
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, source_path, project_code=None, site_id=None, template_name=None, template_hash=None):
+        """
+        Move a generated report file into the archive and record it.
+
+        Args:
+            source_path: Path of the generated file (moved, not copied)
+            project_code: Sanitized project code
+            site_id: Site ID text value, if the job had one
+            template_name: Original template filename
+            template_hash: SHA-256 of the template bytes
+
+        Returns:
+            dict: The stored record
+        """
+        report_id, path = self._new_path(os.path.basename(source_path))
+        shutil.move(source_path, path)
+        return self._insert(report_id, path, project_code, site_id, template_name, template_hash)
+
+    def add_bytes(self, data, filename, project_code=None, site_id=None, template_name=None, template_hash=None):
+        """
+        Write an in-memory report (bytes or buffer) into the archive and record it.
+        Same arguments as add(), with filename naming the stored file.
+        """
+        report_id, path = self._new_path(filename)
+        with open(path, "wb") as f:
+            f.write(data)
+        return self._insert(report_id, path, project_code, site_id, template_name, template_hash)
+
+    def _new_path(self, filename):
+        report_id = uuid.uuid4().hex
+        report_dir = os.path.join(self.files_dir, report_id)
+        os.makedirs(report_dir)
+        return report_id, os.path.join(report_dir, filename)
+
+    def _insert(self, report_id, path, project_code, site_id, template_name, template_hash):
+        record = {
+            "report_id": report_id,
+            "project_code": project_code,
+            "site_id": site_id,
+            "template_name": template_name,
+            "template_hash": template_hash,
+            "filename": os.path.basename(path),
+            "path": path,
+            "size": os.path.getsize(path),
+            "created_at": time.time(),
+        }
+
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO reports ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                [record[c] for c in COLUMNS],
+            )
+
+        return record
+
+    def get(self, report_id):
+        """Return the record for report_id, or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM reports WHERE report_id = ?", (report_id,)).fetchone()
+        return dict(row) if row else None
+
+    def _write_job_file(self, report_id, name, data):
+        with open(os.path.join(self.files_dir, report_id, name), "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    def _read_job_file(self, report_id, name):
+        if not self.get(report_id):
+            return None
+        try:
+            with open(os.path.join(self.files_dir, report_id, name), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_manifest(self, report_id, manifest):
+        """Store the job manifest (placeholder locations, values, media parts) with a report."""
+        self._write_job_file(report_id, MANIFEST_NAME, manifest)
+
+    def load_manifest(self, report_id):
+        """Return the job manifest of a report, or None if it has none."""
+        return self._read_job_file(report_id, MANIFEST_NAME)
+
+    def save_preview(self, report_id, preview):
+        """Cache the preview (thumbnails + text values) returned for a report."""
+        self._write_job_file(report_id, PREVIEW_NAME, preview)
+
+    def load_preview(self, report_id):
+        """Return the cached preview of a report, or None."""
+        return self._read_job_file(report_id, PREVIEW_NAME)
+
+    def find(self, site_id=None, project_code=None, limit=50):
+        """
+        List reports for a site and/or project, newest first.
+
+        Returns:
+            list: Record dicts
+        """
+        clauses = []
+        params = []
+        if site_id:
+            clauses.append("site_id = ?")
+            params.append(site_id)
+        if project_code:
+            clauses.append("project_code = ?")
+            params.append(project_code)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(limit)
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM reports {where} ORDER BY created_at DESC LIMIT ?", params
+            ).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,292 @@
+# atp_report_patch.py
+import io
+import posixpath
+import zipfile
+
+from lxml import etree
+from PIL import Image
+
+from atp_docx_insert import ATPDocxInserter
+from atp_photo_insert import ATPPhotoInserter
+from atp_placeholders import get_registry
+from atp_zip_pack import write_zip
+
+SHEET_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+# Media extension -> Pillow format a replacement photo must be encoded in
+MEDIA_FORMATS = {".jpeg": "JPEG", ".jpg": "JPEG", ".png": "PNG", ".gif": "GIF"}
+
+
+def build_manifest(inserter, file_type, text_values):
+    """
+    Job manifest recorded with a generated report: where every text
+    placeholder sits (with its template text), which media part fills each
+    photo slot, and the values used. Call after the inserter has saved.
+
+    Args:
+        inserter: ATPPhotoInserter or ATPDocxInserter that produced the report
+        file_type: "excel" or "docx"
+        text_values: Canonical key -> value used for the report
+
+    Returns:
+        dict: JSON-serializable manifest
+    """
+    if file_type == "excel":
+        seen = set()
+        text_locations = []
+        for mapping in inserter.text_mappings:
+            cell = (mapping["sheet"], mapping["target_cell"])
+            if cell in seen:
+                continue
+            seen.add(cell)
+            text_locations.append(
+                {"sheet": cell[0], "cell": cell[1], "template_text": mapping["current_value"]}
+            )
+    else:
+        text_locations = inserter.text_runs
+
+    return {
+        "file_type": file_type,
+        "text_values": dict(text_values),
+        "text_locations": text_locations,
+        "photo_slots": inserter.photo_mappings,
+        "photos": inserter.photo_media(),
+    }
+
+
+def read_entries(data):
+    """(member name, bytes) for every member of a ZIP, in archive order."""
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        return [(info.filename, zf.read(info)) for info in zf.infolist()]
+
+
+def encode_like(photo, member):
+    """
+    Photo bytes in the format of the media member they replace, so the
+    content type and relationships of the part stay valid.
+    """
+    if hasattr(photo, "read"):
+        photo.seek(0)
+        data = photo.read()
+    else:
+        with open(photo, "rb") as f:
+            data = f.read()
+
+    target = MEDIA_FORMATS.get(posixpath.splitext(member)[1].lower(), "PNG")
+    with Image.open(io.BytesIO(data)) as img:
+        if img.format == target:
+            return data
+        if target == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        img.save(out, target)
+        return out.getvalue()
+
+
+def sheet_members(parts):
+    """Map sheet names to their worksheet XML members via workbook.xml and its rels."""
+    workbook = etree.fromstring(parts["xl/workbook.xml"])
+    rels = etree.fromstring(parts["xl/_rels/workbook.xml.rels"])
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+
+    members = {}
+    for sheet in workbook.iter(f"{{{SHEET_NS}}}sheet"):
+        target = targets[sheet.get(f"{{{REL_NS}}}id")]
+        if target.startswith("/"):
+            members[sheet.get("name")] = target.lstrip("/")
+        else:
+            members[sheet.get("name")] = posixpath.normpath(posixpath.join("xl", target))
+    return members
+
+
+def patch_sheet_cells(sheet_xml, cells):
+    """
+    Set cells of a worksheet XML part to inline strings, or formulas for
+    "="-prefixed text.
+
+    Args:
+        sheet_xml: Worksheet part bytes
+        cells: Dict of coordinate (e.g. "B4") -> new text
+
+    Returns:
+        bytes: The patched part; styles and every other cell are untouched
+    """
+    root = etree.fromstring(sheet_xml)
+    for c in root.iter(f"{{{SHEET_NS}}}c"):
+        text = cells.get(c.get("r"))
+        if text is None:
+            continue
+
+        if text.startswith("="):
+            # Keep <f> (and its attributes), drop the cached result so Excel recalculates
+            formula = c.find(f"{{{SHEET_NS}}}f")
+            for child in list(c):
+                if child is not formula:
+                    c.remove(child)
+            if formula is None:
+                formula = etree.SubElement(c, f"{{{SHEET_NS}}}f")
+            formula.text = text[1:]
+            c.attrib.pop("t", None)
+            continue
+
+        # Drop the shared-string reference / formula; the orphaned shared string is harmless
+        for child in list(c):
+            c.remove(child)
+        c.set("t", "inlineStr")
+        t = etree.SubElement(etree.SubElement(c, f"{{{SHEET_NS}}}is"), f"{{{SHEET_NS}}}t")
+        t.text = text
+        t.set(XML_SPACE, "preserve")
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+
+class ReportPatcher:
+    """
+    Applies a correction to a generated report using its job manifest,
+    instead of regenerating it from the template.
+
+    - A replacement photo overwrites the slot's media part in the ZIP; the
+      drawing, size and every other part are kept as they are.
+    - Changed text values re-render only the cells (Excel) or runs (DOCX)
+      whose template text uses them.
+    - Slots that had no photo (or share their media part with another slot)
+      get the photo inserted through openpyxl / python-docx on the patched file.
+    """
+
+    def __init__(self, manifest, registry=None):
+        self.manifest = manifest
+        self.registry = registry or get_registry()
+        self.file_type = manifest["file_type"]
+
+    def slot_key(self, mapping):
+        """
+        Resolve a photo mapping from the client to a manifest slot key.
+
+        Excel slots are keyed "Sheet!A1" (the slot at sheet + target_cell,
+        or the slot found by photo_type / slot_index), DOCX slots by
+        slot_index. Only slots recorded in the manifest are resolved.
+
+        Returns:
+            str or None: Slot key, None if the mapping names no known slot
+        """
+        slots = self.manifest["photo_slots"]
+        slot_index = mapping.get("slot_index")
+
+        if self.file_type == "docx":
+            if isinstance(slot_index, int) and 0 <= slot_index < len(slots):
+                return str(slot_index)
+            return None
+
+        if mapping.get("sheet") and mapping.get("target_cell"):
+            for slot in slots:
+                if slot["sheet"] == mapping["sheet"] and slot["photo_cell"] == mapping["target_cell"]:
+                    return f"{slot['sheet']}!{slot['photo_cell']}"
+            return None
+        for slot in slots:
+            if mapping.get("photo_type") and slot["photo_type"] == mapping["photo_type"]:
+                return f"{slot['sheet']}!{slot['photo_cell']}"
+        if isinstance(slot_index, int) and 0 <= slot_index < len(slots):
+            return f"{slots[slot_index]['sheet']}!{slots[slot_index]['photo_cell']}"
+        return None
+
+    def apply(self, report_bytes, text_values, photos, output, **pack_options):
+        """
+        Patch a report.
+
+        Args:
+            report_bytes: The archived report
+            text_values: Canonical key -> new value for the fields to change
+            photos: Slot key (see slot_key) -> photo path or binary file-like
+            output: File path or writable binary file-like object for the result
+            **pack_options: Passed to write_zip / the inserters' save()
+
+        Returns:
+            tuple: (updated manifest, summary of what was changed)
+        """
+        manifest = dict(self.manifest)
+        values = {**manifest["text_values"], **text_values}
+        changed = {key for key, value in text_values.items() if manifest["text_values"].get(key) != value}
+        manifest["text_values"] = values
+
+        entries = read_entries(report_bytes)
+        index = {name: i for i, (name, _) in enumerate(entries)}
+
+        # Swap media parts in place where the slot owns its part
+        media = dict(manifest["photos"])
+        usage = {}
+        for member in media.values():
+            usage[member] = usage.get(member, 0) + 1
+
+        swapped = []
+        inserts = {}
+        for key, photo in photos.items():
+            member = media.get(key)
+            if member in index and usage[member] == 1:
+                entries[index[member]] = (member, encode_like(photo, member))
+                swapped.append(key)
+            else:
+                inserts[key] = photo
+
+        formula = self.file_type == "excel"
+        locations = [
+            location
+            for location in manifest["text_locations"]
+            if changed & {info["key"] for info in self.registry.find_text(location["template_text"], formula)}
+        ]
+
+        if self.file_type == "excel" and locations:
+            by_sheet = {}
+            for location in locations:
+                text, _ = self.registry.substitute(location["template_text"], values, formula=True)
+                by_sheet.setdefault(location["sheet"], {})[location["cell"]] = text
+
+            members = sheet_members(dict(entries))
+            for sheet, cells in by_sheet.items():
+                member = members[sheet]
+                entries[index[member]] = (member, patch_sheet_cells(entries[index[member]][1], cells))
+
+        if inserts or (self.file_type == "docx" and locations):
+            # The rest needs the document model; hand it the patched package
+            # stored (not deflated), it gets packed properly on save
+            staged = io.BytesIO()
+            write_zip(entries, staged, compresslevel=0)
+            staged.seek(0)
+            media, inserted = self._apply_in_document(staged, locations, values, inserts, output, pack_options)
+        else:
+            write_zip(entries, output, **pack_options)
+            inserted = []
+
+        manifest["photos"] = media
+        summary = {
+            "text_fields": sorted(changed),
+            "text_locations": len(locations),
+            "photos_replaced": swapped,
+            "photos_inserted": inserted,
+            "photos_failed": [key for key in inserts if key not in inserted],
+        }
+        return manifest, summary
+
+    def _apply_in_document(self, staged, locations, values, inserts, output, pack_options):
+        plan = {"photo_mappings": self.manifest["photo_slots"], "text_mappings": []}
+        inserted = []
+
+        if self.file_type == "excel":
+            inserter = ATPPhotoInserter(staged, registry=self.registry, plan=plan)
+            for key, photo in inserts.items():
+                sheet, cell = key.rsplit("!", 1)
+                if inserter.insert_photo_by_cell(sheet, cell, photo):
+                    inserted.append(key)
+        else:
+            inserter = ATPDocxInserter(staged, registry=self.registry, plan=plan)
+            for key, photo in inserts.items():
+                if inserter.insert_photo(int(key), photo):
+                    inserted.append(key)
+
+            paragraphs = [paragraph for paragraph, _ in inserter.iter_paragraphs()]
+            for location in locations:
+                run = paragraphs[location["paragraph"]].runs[location["run"]]
+                run.text, _ = self.registry.substitute(location["template_text"], values)
+
+        inserter.save(output, **pack_options)
+        return inserter.photo_media(), inserted
@@ -0,0 +1,80 @@
+# atp_report_preview.py
+import base64
+import io
+import zipfile
+
+from atp_image_intake import make_thumbnail
+from atp_placeholders import get_registry
+
+DEFAULT_THUMB_SIZE = (160, 120)
+
+
+def build_preview(report, manifest, registry=None, thumb_size=DEFAULT_THUMB_SIZE):
+    """
+    Lightweight preview of a generated report, so crews can check it on the
+    phone without downloading the file: one entry per photo slot with a
+    small JPEG of the photo that actually landed there, and the text value
+    used for every placeholder.
+
+    Args:
+        report: Path or binary file-like object of the generated report
+        manifest: Job manifest of the report (see atp_report_patch.build_manifest)
+        registry: PlaceholderRegistry, defaults to the shared one
+        thumb_size: (width, height) box of the thumbnails
+
+    Returns:
+        dict: photos, text_values, photo_slots / photos_filled counts and
+              missing_required (keys of required fields left empty)
+    """
+    registry = registry or get_registry()
+    media = manifest["photos"]
+
+    photos = []
+    with zipfile.ZipFile(report) as zf:
+        members = set(zf.namelist())
+        for index, slot in enumerate(manifest["photo_slots"]):
+            if manifest["file_type"] == "excel":
+                key = f"{slot['sheet']}!{slot['photo_cell']}"
+                location = f"{slot['sheet']}, cell {slot['photo_cell']}"
+            else:
+                key = str(index)
+                location = slot["location"]
+
+            thumbnail = None
+            if media.get(key) in members:
+                data = make_thumbnail(io.BytesIO(zf.read(media[key])), thumb_size)
+                thumbnail = "data:image/jpeg;base64," + base64.b64encode(data).decode("ascii")
+
+            photos.append(
+                {
+                    "slot": key,
+                    "slot_index": index,
+                    "photo_type": slot["photo_type"],
+                    "location": location,
+                    "thumbnail": thumbnail,
+                }
+            )
+
+    text_values = {}
+    formula = manifest["file_type"] == "excel"
+    for location in manifest["text_locations"]:
+        for info in registry.find_text(location["template_text"], formula):
+            entry = text_values.setdefault(
+                info["key"],
+                {
+                    "key": info["key"],
+                    "display_name": info["display_name"],
+                    "required": info["required"],
+                    "value": manifest["text_values"].get(info["key"]),
+                    "occurrences": 0,
+                },
+            )
+            entry["occurrences"] += 1
+
+    return {
+        "photos": photos,
+        "text_values": list(text_values.values()),
+        "photo_slots": len(photos),
+        "photos_filled": sum(1 for p in photos if p["thumbnail"]),
+        "missing_required": [t["key"] for t in text_values.values() if t["required"] and not t["value"]],
+    }
@@ -0,0 +1,208 @@
+# atp_sheet_parallel.py
+import io
+import multiprocessing
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from lxml import etree
+from openpyxl.utils import column_index_from_string, get_column_letter
+
+from atp_photo_insert import collect_cell_placeholders
+from atp_placeholders import get_registry
+from atp_report_patch import SHEET_NS, patch_sheet_cells, sheet_members
+from atp_zip_pack import workbook_entries, write_zip
+
+# Below this many sheets the pool round trip costs more than it saves
+PARALLEL_MIN_SHEETS = 8
+
+_ROW = f"{{{SHEET_NS}}}row"
+_CELL = f"{{{SHEET_NS}}}c"
+_VALUE = f"{{{SHEET_NS}}}v"
+_FORMULA = f"{{{SHEET_NS}}}f"
+_SI = f"{{{SHEET_NS}}}si"
+_NSMAP = {"main": SHEET_NS}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # forkserver: forking a threaded web worker directly is not safe
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"))
+        return _pool
+
+
+def _map(func, tasks, workers):
+    """func(*task) for each task, on the shared process pool when worth it."""
+    if not workers or workers <= 1 or len(tasks) < PARALLEL_MIN_SHEETS:
+        return [func(*task) for task in tasks]
+
+    global _pool
+    try:
+        return list(_get_pool(workers).map(func, *zip(*tasks)))
+    except BrokenProcessPool:
+        # A worker died (OOM kill etc.) - drop the pool and finish in-process
+        with _pool_lock:
+            _pool = None
+        return [func(*task) for task in tasks]
+
+
+def _rich_text(element):
+    """Text of an <si> / <is> element: plain <t> or rich-text runs, phonetic runs ignored."""
+    return "".join(element.xpath("main:t/text()|main:r/main:t/text()", namespaces=_NSMAP))
+
+
+def read_shared_strings(zf):
+    if "xl/sharedStrings.xml" not in zf.namelist():
+        return []
+
+    strings = []
+    with zf.open("xl/sharedStrings.xml") as f:
+        for _, si in etree.iterparse(f, tag=_SI):
+            strings.append(_rich_text(si))
+            si.clear()
+    return strings
+
+
+def scan_sheet_xml(sheet_xml, marked):
+    """
+    Cells of one worksheet part that may hold a placeholder. Runs in a
+    worker process, so it only parses; classification happens in the parent.
+
+    Args:
+        sheet_xml: Worksheet part bytes
+        marked: Shared-string indices whose text contains "["
+
+    Returns:
+        list: (coordinate, text or shared-string index) in row-major order
+    """
+    found = []
+    row_number = 0
+
+    for _, row in etree.iterparse(io.BytesIO(sheet_xml), tag=_ROW):
+        row_number = int(row.get("r", row_number + 1))
+        column = 0
+
+        for c in row.iterchildren(_CELL):
+            ref = c.get("r")
+            if ref:
+                column = column_index_from_string(ref.rstrip("0123456789"))
+            else:
+                column += 1
+                ref = f"{get_column_letter(column)}{row_number}"
+
+            # Same values openpyxl reports: formulas as "=...", then by cell type
+            formula = c.find(_FORMULA)
+            cell_type = c.get("t")
+            if formula is not None and formula.text:
+                value = "=" + formula.text
+            elif cell_type == "s":
+                index = int(c.findtext(_VALUE) or -1)
+                if index in marked:
+                    found.append((ref, index))
+                continue
+            elif cell_type == "inlineStr":
+                is_element = c.find(f"{{{SHEET_NS}}}is")
+                value = _rich_text(is_element) if is_element is not None else ""
+            elif cell_type == "str":
+                value = c.findtext(_VALUE) or ""
+            else:
+                continue
+
+            if "[" in value:
+                found.append((ref, value))
+
+        row.clear()
+        while row.getprevious() is not None:
+            del row.getparent()[0]
+
+    return found
+
+
+def scan_workbook(source, registry=None, workers=None):
+    """
+    Find photo and text placeholders straight from the worksheet XML, one
+    sheet per task, without loading the workbook into openpyxl.
+
+    Args:
+        source: Path or binary file-like object of the .xlsx
+        registry: PlaceholderRegistry, defaults to the shared one
+        workers: Process pool size; None or 1 scans in-process
+
+    Returns:
+        tuple: (photo_mappings, text_mappings), same as ATPPhotoInserter.scan_placeholders()
+    """
+    registry = registry or get_registry()
+
+    with zipfile.ZipFile(source) as zf:
+        members = sheet_members(
+            {name: zf.read(name) for name in ("xl/workbook.xml", "xl/_rels/workbook.xml.rels")}
+        )
+        strings = read_shared_strings(zf)
+        # Chartsheets have no cells
+        sheets = [(name, zf.read(member)) for name, member in members.items() if "/worksheets/" in member]
+
+    marked = {i for i, text in enumerate(strings) if "[" in text}
+    results = _map(scan_sheet_xml, [(xml, marked) for _, xml in sheets], workers)
+
+    photo_mappings = []
+    text_mappings = []
+    for (sheet_name, _), cells in zip(sheets, results):
+        for coordinate, value in cells:
+            if isinstance(value, int):
+                value = strings[value]
+            collect_cell_placeholders(registry, sheet_name, coordinate, value, photo_mappings, text_mappings)
+
+    return photo_mappings, text_mappings
+
+
+def fill_workbook(workbook, text_mappings, values, output, registry=None, sheet_workers=None, **pack_options):
+    """
+    Save a workbook with its text placeholders filled in the serialized
+    sheet XML, sheets patched concurrently, instead of walking every cell
+    before saving.
+
+    Args:
+        workbook: openpyxl Workbook (photos already inserted)
+        text_mappings: Text mappings of the template's plan
+        values: Dict of placeholder key -> value
+        output: File path or writable binary file-like object
+        registry: PlaceholderRegistry, defaults to the shared one
+        sheet_workers: Process pool size for patching; None or 1 patches in-process
+        **pack_options: Passed to write_zip (compresslevel, workers)
+
+    Returns:
+        dict: Count of replacements per key
+    """
+    registry = registry or get_registry()
+    values = {registry.canonical_key(k): v for k, v in values.items()}
+
+    cells_by_sheet = {}
+    replacements = {}
+    for mapping in text_mappings:
+        cells = cells_by_sheet.setdefault(mapping["sheet"], {})
+        if mapping["target_cell"] in cells:
+            continue
+
+        new_text, counts = registry.substitute(mapping["current_value"], values, formula=True)
+        if counts:
+            cells[mapping["target_cell"]] = new_text
+            for key, count in counts.items():
+                replacements[key] = replacements.get(key, 0) + count
+
+    entries = workbook_entries(workbook)
+    index = {name: i for i, (name, _) in enumerate(entries)}
+    members = sheet_members({name: entries[index[name]][1] for name in ("xl/workbook.xml", "xl/_rels/workbook.xml.rels")})
+
+    targets = [(members[sheet], cells) for sheet, cells in cells_by_sheet.items() if cells]
+    patched = _map(patch_sheet_cells, [(entries[index[member]][1], cells) for member, cells in targets], sheet_workers)
+    for (member, _), sheet_xml in zip(targets, patched):
+        entries[index[member]] = (member, sheet_xml)
+
+    write_zip(entries, output, **pack_options)
+    return replacements
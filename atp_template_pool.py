@@ -0,0 +1,113 @@
+# atp_template_pool.py
+import copy
+import pickle
+import threading
+from collections import OrderedDict
+
+from docx.document import Document
+from docx.opc.part import XmlPart
+from openpyxl import Workbook
+
+# Parsed XML takes several times its serialized size in memory (lxml nodes)
+XML_FOOTPRINT_FACTOR = 5
+
+
+class _WorkbookSnapshot:
+    """
+    Pristine openpyxl Workbook kept as a pickle. Unpickling rebuilds the
+    cell objects faster than load_workbook parses XML, and the pickle size
+    is the entry's exact footprint. (copy.deepcopy is both slower and
+    wrong here: it empties openpyxl's IndexedList style tables.)
+    """
+
+    def __init__(self, workbook):
+        self.blob = pickle.dumps(workbook, pickle.HIGHEST_PROTOCOL)
+        self.footprint = len(self.blob)
+
+    def clone(self):
+        return pickle.loads(self.blob)
+
+
+class _DocumentSnapshot:
+    """Pristine python-docx Document, cloned by copying its lxml trees."""
+
+    def __init__(self, document):
+        self.document = document
+        self.footprint = sum(
+            len(part.blob) * (XML_FOOTPRINT_FACTOR if isinstance(part, XmlPart) else 1)
+            for part in document.part.package.iter_parts()
+        )
+        self._lock = threading.Lock()
+
+    def clone(self):
+        # Copies only read the pristine tree, but lxml is not guaranteed
+        # safe for concurrent access to one document, so one at a time
+        with self._lock:
+            return copy.deepcopy(self.document)
+
+
+class TemplatePool:
+    """
+    Per-process pool of parsed templates, keyed by template hash.
+
+    checkout() returns an independent Workbook / Document every call: the
+    first one comes from parsing the template, later ones are cheap copies
+    of a pristine parsed snapshot. Least recently used templates are
+    evicted once the estimated footprint exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def checkout(self, template_hash, parse):
+        """
+        Args:
+            template_hash: SHA-256 of the template bytes (templates are immutable per hash)
+            parse: Callable returning a freshly parsed Workbook or Document, used on a miss
+
+        Returns:
+            Workbook or Document owned by the caller
+        """
+        with self._lock:
+            snapshot = self._entries.get(template_hash)
+            if snapshot:
+                self._entries.move_to_end(template_hash)
+
+        if snapshot:
+            return snapshot.clone()
+
+        parsed = parse()
+        if isinstance(parsed, Workbook):
+            snapshot = _WorkbookSnapshot(parsed)
+        elif isinstance(parsed, Document):
+            snapshot = _DocumentSnapshot(copy.deepcopy(parsed))
+        else:
+            return parsed
+
+        self._add(template_hash, snapshot)
+        return parsed
+
+    def _add(self, template_hash, snapshot):
+        if snapshot.footprint > self.max_bytes:
+            return
+
+        with self._lock:
+            if template_hash in self._entries:
+                return  # another request parsed it at the same time
+            self._entries[template_hash] = snapshot
+            self.total_bytes += snapshot.footprint
+
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= evicted.footprint
+
+    def stats(self):
+        with self._lock:
+            return {
+                "templates": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
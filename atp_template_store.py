@@ -0,0 +1,213 @@
+# atp_template_store.py
+import hashlib
+import io
+import json
+import mmap
+import os
+import shutil
+import tempfile
+
+
+def hash_bytes(data):
+    """SHA-256 hex digest, same digest the browser computes with crypto.subtle."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class MappedTemplate(io.RawIOBase):
+    """
+    Read-only file object over a memory-mapped template.
+
+    Every worker mapping the same file shares the page cache copy. Each
+    caller gets its own instance (own position), so this is safe to use
+    from concurrent requests.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._pos = 0
+        self.name = path
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._map[self._pos : self._pos + len(buffer)]
+        buffer[: len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        else:
+            self._pos = len(self._map) + offset
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def __len__(self):
+        return len(self._map)
+
+    def getbuffer(self):
+        return memoryview(self._map)
+
+    def close(self):
+        if not self.closed:
+            self._map.close()
+        super().close()
+
+
+class TemplateStore:
+    """
+    On-disk store of template bytes and placeholder plans shared by all
+    worker processes and kept across restarts.
+
+    Layout: <root>/<sha256>/template.<ext> and meta.json (filename, the
+    analysis returned to the client, and the inserter's placeholder plan
+    tagged with the registry fingerprint it was built with). All writes go
+    through a temp file + os.replace, so readers never see partial files.
+    """
+
+    def __init__(self, root, max_bytes=2 * 1024 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, template_hash):
+        # Hashes come from clients; anything but hex would escape the store
+        if len(template_hash) != 64 or not all(c in "0123456789abcdef" for c in template_hash):
+            raise ValueError("Invalid template hash")
+        return os.path.join(self.root, template_hash)
+
+    def _atomic_write(self, path, data):
+        directory = os.path.dirname(path)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _read_meta(self, template_hash):
+        try:
+            with open(os.path.join(self._dir(template_hash), "meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, data, filename, template_hash=None):
+        """
+        Store template bytes (no-op if another worker already did).
+
+        Returns:
+            str: The template hash
+        """
+        template_hash = template_hash or hash_bytes(data)
+        if self.get(template_hash):
+            return template_hash
+
+        directory = self._dir(template_hash)
+        os.makedirs(directory, exist_ok=True)
+        ext = os.path.splitext(filename)[1].lower() or ".bin"
+        template_file = f"template{ext}"
+
+        self._atomic_write(os.path.join(directory, template_file), data)
+        meta = {
+            "hash": template_hash,
+            "filename": filename,
+            "template_file": template_file,
+            "size": len(data),
+            "analysis": None,
+            "plan": None,
+        }
+        self._atomic_write(os.path.join(directory, "meta.json"), json.dumps(meta).encode("utf-8"))
+
+        self.prune()
+        return template_hash
+
+    def set_analysis(self, template_hash, analysis, plan, registry_fingerprint):
+        """Record the analysis and placeholder plan computed for a template."""
+        meta = self._read_meta(template_hash)
+        if not meta:
+            return
+        meta["analysis"] = analysis
+        meta["plan"] = {"registry": registry_fingerprint, **plan}
+        self._atomic_write(
+            os.path.join(self._dir(template_hash), "meta.json"),
+            json.dumps(meta).encode("utf-8"),
+        )
+
+    def get(self, template_hash, registry_fingerprint=None):
+        """
+        Returns:
+            dict: meta plus "path", or None if the template is not stored.
+                  analysis/plan are None when missing or built with a
+                  different placeholder registry than registry_fingerprint.
+        """
+        try:
+            directory = self._dir(template_hash)
+        except ValueError:
+            return None
+
+        meta = self._read_meta(template_hash)
+        if not meta:
+            return None
+
+        path = os.path.join(directory, meta["template_file"])
+        if not os.path.exists(path):
+            return None
+
+        plan = meta.get("plan")
+        if registry_fingerprint and plan and plan.get("registry") != registry_fingerprint:
+            meta["plan"] = None
+            meta["analysis"] = None
+
+        # Directory mtime doubles as last-used time for pruning
+        try:
+            os.utime(directory)
+        except OSError:
+            pass
+
+        meta["path"] = path
+        return meta
+
+    def open(self, template_hash):
+        """Memory-mapped, file-like view of the template bytes."""
+        meta = self.get(template_hash)
+        if not meta:
+            raise KeyError(template_hash)
+        return MappedTemplate(meta["path"])
+
+    def prune(self):
+        """Delete least recently used templates until under max_bytes."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            directory = os.path.join(self.root, name)
+            if not os.path.isdir(directory):
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(directory, f))
+                for f in os.listdir(directory)
+                if os.path.isfile(os.path.join(directory, f))
+            )
+            entries.append((os.path.getmtime(directory), size, directory))
+            total += size
+
+        for _, size, directory in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            # Workers that already mapped the file keep their mapping
+            shutil.rmtree(directory, ignore_errors=True)
+            total -= size
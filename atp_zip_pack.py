@@ -0,0 +1,210 @@
+# atp_zip_pack.py
+import datetime
+import os
+import struct
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from docx.opc.pkgwriter import PackageWriter
+from openpyxl.writer.excel import ExcelWriter
+
+# Already-compressed formats - deflating them again costs CPU for ~0 bytes saved
+MEDIA_EXTENSIONS = {".jpeg", ".jpg", ".png", ".gif"}
+
+DEFAULT_COMPRESS_LEVEL = 6
+# Parts at least this large are deflated on worker threads (zlib releases the GIL)
+PARALLEL_THRESHOLD = 256 * 1024
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+_ZIP32_LIMIT = 0xFFFFFFFF
+_MAX_ENTRIES = 0xFFFF
+
+
+class ZipEntryCollector:
+    """
+    Stand-in for the ZipFile openpyxl's ExcelWriter writes into.
+    Keeps (member name, bytes) in write order instead of compressing.
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def writestr(self, name, data):
+        if isinstance(name, zipfile.ZipInfo):
+            name = name.filename
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.entries.append((name, data))
+
+    def write(self, filename, arcname=None):
+        with open(filename, "rb") as f:
+            self.writestr(arcname or os.path.basename(filename), f.read())
+
+    def namelist(self):
+        return [name for name, _ in self.entries]
+
+    def close(self):
+        pass
+
+
+class _DocxPartCollector:
+    """PhysPkgWriter replacement for python-docx, same idea as ZipEntryCollector."""
+
+    def __init__(self):
+        self.entries = []
+
+    def write(self, pack_uri, blob):
+        self.entries.append((pack_uri.membername, blob))
+
+    def close(self):
+        pass
+
+
+def is_media(name):
+    return os.path.splitext(name)[1].lower() in MEDIA_EXTENSIONS
+
+
+def _deflate(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _dos_datetime(timestamp):
+    t = time.localtime(timestamp)
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def _compress_entries(entries, compresslevel, workers, parallel_threshold):
+    """
+    Returns a list of (name, raw, payload, method) in input order.
+    Media and anything that does not shrink is stored.
+    """
+    results = [None] * len(entries)
+    large = []
+
+    for i, (name, data) in enumerate(entries):
+        if compresslevel == 0 or is_media(name) or not data:
+            results[i] = (name, data, data, zipfile.ZIP_STORED)
+        elif workers > 1 and len(data) >= parallel_threshold:
+            large.append(i)
+        else:
+            results[i] = (name, data, _deflate(data, compresslevel), zipfile.ZIP_DEFLATED)
+
+    if large:
+        with ThreadPoolExecutor(max_workers=min(workers, len(large))) as pool:
+            futures = {i: pool.submit(_deflate, entries[i][1], compresslevel) for i in large}
+            for i, future in futures.items():
+                name, data = entries[i]
+                results[i] = (name, data, future.result(), zipfile.ZIP_DEFLATED)
+
+    for i, (name, data, payload, method) in enumerate(results):
+        if method == zipfile.ZIP_DEFLATED and len(payload) >= len(data):
+            results[i] = (name, data, data, zipfile.ZIP_STORED)
+
+    return results
+
+
+def _write_zip64_fallback(entries, out, compresslevel):
+    """Huge archives go through zipfile, which handles the ZIP64 extensions."""
+    with zipfile.ZipFile(out, "w", allowZip64=True) as zf:
+        for name, data in entries:
+            if compresslevel == 0 or is_media(name):
+                zf.writestr(name, data, compress_type=zipfile.ZIP_STORED)
+            else:
+                zf.writestr(name, data, compress_type=zipfile.ZIP_DEFLATED, compresslevel=compresslevel)
+
+
+def write_zip(
+    entries,
+    output,
+    compresslevel=DEFAULT_COMPRESS_LEVEL,
+    workers=DEFAULT_WORKERS,
+    parallel_threshold=PARALLEL_THRESHOLD,
+):
+    """
+    Write (name, bytes) entries to a ZIP archive.
+
+    Media members are stored uncompressed, everything else is deflated at
+    compresslevel, with large members compressed concurrently.
+
+    Args:
+        entries: List of (member name, bytes) in the order they should appear
+        output: File path or writable binary file-like object
+        compresslevel: zlib level 0-9 for non-media members (0 stores everything)
+        workers: Threads used for members >= parallel_threshold bytes
+        parallel_threshold: Size in bytes above which a member is compressed in parallel
+    """
+    if isinstance(output, (str, os.PathLike)):
+        with open(output, "wb") as f:
+            return write_zip(entries, f, compresslevel, workers, parallel_threshold)
+
+    if len(entries) > _MAX_ENTRIES or sum(len(d) for _, d in entries) > _ZIP32_LIMIT:
+        return _write_zip64_fallback(entries, output, compresslevel)
+
+    dos_time, dos_date = _dos_datetime(time.time())
+    central = []
+    offset = 0
+
+    for name, raw, payload, method in _compress_entries(entries, compresslevel, workers, parallel_threshold):
+        encoded = name.encode("utf-8")
+        flags = 0x800 if not name.isascii() else 0
+        crc = zlib.crc32(raw) & 0xFFFFFFFF
+
+        header = struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034B50, 20, flags, method, dos_time, dos_date,
+            crc, len(payload), len(raw), len(encoded), 0,
+        )
+        output.write(header)
+        output.write(encoded)
+        output.write(payload)
+
+        central.append(
+            struct.pack(
+                "<IHHHHHHIIIHHHHHII",
+                0x02014B50, 20, 20, flags, method, dos_time, dos_date,
+                crc, len(payload), len(raw), len(encoded), 0, 0, 0, 0, 0, offset,
+            )
+            + encoded
+        )
+        offset += len(header) + len(encoded) + len(payload)
+
+    directory = b"".join(central)
+    output.write(directory)
+    output.write(
+        struct.pack(
+            "<IHHHHIIH",
+            0x06054B50, 0, 0, len(central), len(central), len(directory), offset, 0,
+        )
+    )
+
+
+def workbook_entries(workbook):
+    """Serialize an openpyxl Workbook to (member name, bytes) entries without packing."""
+    workbook.properties.modified = datetime.datetime.now(tz=datetime.timezone.utc).replace(tzinfo=None)
+    collector = ZipEntryCollector()
+    ExcelWriter(workbook, collector).save()
+    return collector.entries
+
+
+def save_workbook(workbook, output, **pack_options):
+    """openpyxl Workbook.save() replacement that packs with write_zip()."""
+    write_zip(workbook_entries(workbook), output, **pack_options)
+
+
+def save_document(document, output, **pack_options):
+    """python-docx Document.save() replacement that packs with write_zip()."""
+    package = document.part.package
+    for part in package.parts:
+        part.before_marshal()
+
+    # Same steps as PackageWriter.write(), minus its hard-coded ZIP_DEFLATED writer
+    collector = _DocxPartCollector()
+    PackageWriter._write_content_types_stream(collector, package.parts)
+    PackageWriter._write_pkg_rels(collector, package.rels)
+    PackageWriter._write_parts(collector, package.parts)
+    write_zip(collector.entries, output, **pack_options)